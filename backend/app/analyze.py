@@ -0,0 +1,123 @@
+import contextvars
+import re
+from concurrent.futures import ThreadPoolExecutor
+from recommender import get_recommendations
+from hobby_recommender import recommend_hobbies
+from visualization import create_visualizations
+from response_cache import ResponseCache
+from metrics import span
+
+# Upper bound on tasks from one request that run at the same time
+MAX_PARALLEL_TASKS = 4
+HELP = ("I can help with: summary, friend recommendations, hobby/club recommendations, visualizations, "
+        "or user counts. Please specify one of these tasks.")
+
+class Snapshot:
+    """
+    The dataset and models one analyze request works on, captured once so every task sees
+    the same version even if an upload lands halfway through. Artefacts that several tasks
+    need (stats payload, chart, counts) are computed once per snapshot; recommendations go
+    through the shared response cache, so they are also reused by the recommend endpoints.
+    """
+    def __init__(self, df, stats, friend_model, hobby_model, version, responses):
+        self.df = df
+        self.stats = stats
+        self.friend_model = friend_model
+        self.hobby_model = hobby_model
+        self.version = version
+        self.responses = responses
+        self._artefacts = ResponseCache(max_entries=64, ttl=float("inf"))
+
+    def shared(self, name, compute):
+        return self._artefacts.get_or_compute("analyze", (name,), compute)
+
+def classify(task: str):
+    """The kind of analysis a free-text task asks for, or None if it matches nothing."""
+    task_lower = task.lower().strip()
+    if "summary" in task_lower or "describe" in task_lower:
+        return "summary"
+    if "recommend" in task_lower and "friend" in task_lower:
+        return "friends"
+    if "recommend" in task_lower and ("hobby" in task_lower or "hobbies" in task_lower or "club" in task_lower):
+        return "hobbies"
+    if "visualiz" in task_lower or "chart" in task_lower or "plot" in task_lower:
+        return "visualize"
+    if "count" in task_lower or "frequency" in task_lower:
+        return "count"
+    return None
+
+def _summary(snap: Snapshot):
+    stats = snap.stats
+    return {
+        "shape": stats["shape"],
+        "columns": stats["columns"],
+        "dtypes": stats["dtypes"],
+        "missing_values": stats["missing"],
+        "unique_counts": stats["unique_counts"],
+        "numeric": stats["numeric"],
+        "top_values": stats["top_values"],
+        "sample_data": snap.df.head(5).to_dict(orient="records"),
+    }
+
+def _friends(snap: Snapshot, task_lower):
+    df = snap.df
+    # Extract user from task if mentioned
+    user_match = re.search(r'for\s+(\w+)', task_lower)
+    target_user = user_match.group(1) if user_match else str(df['User'].iloc[0]) if 'User' in df.columns else None
+    if not (target_user and 'User' in df.columns and 'Friend' in df.columns):
+        return "Unable to find user or friendship data for recommendations"
+    # Same key and payload as GET /api/recommend/{user_id}?top_k=5
+    return snap.responses.get_or_compute("recommend", (snap.version, target_user, 5, "similarity", None), lambda: {
+        "user": target_user,
+        "recommendations": get_recommendations(df, target_user, top_k=5, model=snap.friend_model),
+    })
+
+def _hobbies(snap: Snapshot, task_lower):
+    df = snap.df
+    user_match = re.search(r'for\s+(\d+)', task_lower)
+    target_user = user_match.group(1) if user_match else str(df['user_id'].iloc[0]) if 'user_id' in df.columns else None
+    if not (target_user and 'user_id' in df.columns and 'hobbies' in df.columns):
+        return "Unable to find user or lifestyle data for hobby/club recommendations"
+    # Same key and payload as GET /api/recommend_hobbies/{user_id}?top_k=5
+    return snap.responses.get_or_compute("recommend_hobbies", (snap.version, target_user, 5, None), lambda: {
+        "user": target_user,
+        "hobby_club_recommendations": recommend_hobbies(df, target_user, top_k=5, model=snap.hobby_model),
+    })
+
+def _visualize(snap: Snapshot):
+    path = snap.shared("chart", lambda: create_visualizations(snap.df, version=snap.version))
+    return {"chart_path": path, "message": "Visualization created successfully"}
+
+def _count(snap: Snapshot):
+    if 'User' not in snap.df.columns:
+        return "No 'User' column found for counting"
+    counts = snap.shared("user_counts", lambda: snap.df['User'].value_counts().to_dict())
+    return {"user_counts": counts, "total_users": len(counts)}
+
+def run_task(snap: Snapshot, task: str):
+    """{"task", "result"} for one free-text task against the snapshot."""
+    kind = classify(task)
+    task_lower = task.lower().strip()
+    with span(f"analyze_{kind or 'unknown'}"):
+        if kind == "summary":
+            result = snap.shared("summary", lambda: _summary(snap))
+        elif kind == "friends":
+            result = _friends(snap, task_lower)
+        elif kind == "hobbies":
+            result = _hobbies(snap, task_lower)
+        elif kind == "visualize":
+            result = _visualize(snap)
+        elif kind == "count":
+            result = _count(snap)
+        else:
+            result = HELP
+    return {"task": task, "result": result}
+
+def run_tasks(snap: Snapshot, tasks, max_workers=MAX_PARALLEL_TASKS):
+    """Run every task against the same snapshot, independent ones in parallel; results keep task order."""
+    if len(tasks) == 1:
+        return [run_task(snap, tasks[0])]
+    # Run each task in a copy of this request's context so its spans reach Server-Timing
+    contexts = [contextvars.copy_context() for _ in tasks]
+    with ThreadPoolExecutor(max_workers=min(len(tasks), max_workers)) as pool:
+        return list(pool.map(lambda ctx, task: ctx.run(run_task, snap, task), contexts, tasks))
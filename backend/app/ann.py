@@ -0,0 +1,173 @@
+import copy
+import time
+import numpy as np
+from scipy import sparse
+from sklearn.cluster import MiniBatchKMeans
+from similarity import l2_normalize, similarity_row, top_k_indices
+from metrics import span
+
+# Below this many rows brute force is already fast enough that an index is not worth building
+ANN_MIN_ROWS = 10_000
+# Fewest inverted lists a query scans; higher means better recall, slower queries
+DEFAULT_N_PROBE = 8
+# Recall@TUNE_K against brute force that fit tunes n_probe up to, on TUNE_QUERIES sampled rows
+TARGET_RECALL = 0.9
+TUNE_K = 10
+TUNE_QUERIES = 100
+# Appended rows are scanned exhaustively until they exceed this fraction of the index
+PENDING_FRACTION = 0.1
+
+class IVFIndex:
+    """
+    Inverted-file index for approximate cosine top-k over an L2-normalized matrix.
+    Rows are bucketed by their nearest k-means centroid; a query only scores the rows
+    in the n_probe buckets whose centroids are closest to it. Unless n_probe is given,
+    fit picks the smallest one that reaches target_recall (see tune_n_probe).
+    """
+    def __init__(self, n_lists=None, n_probe=None, target_recall=TARGET_RECALL, random_state=0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.target_recall = target_recall
+        self.random_state = random_state
+        self.features = None
+        self.centroids = None
+        self.order = None
+        self.offsets = None
+        self.labels = None
+        self.pending = np.empty(0, dtype=np.int64)
+
+    def fit(self, normalized):
+        self.features = normalized
+        n_rows = normalized.shape[0]
+        n_lists = self.n_lists or max(1, int(np.sqrt(n_rows)))
+        n_lists = min(n_lists, n_rows)
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=self.random_state,
+                                 batch_size=4096, n_init=1)
+        labels = kmeans.fit_predict(normalized)
+        self.centroids = l2_normalize(kmeans.cluster_centers_).astype(np.float32)
+        self._set_lists(labels, n_lists)
+        if self.n_probe is None:
+            with span("ann_tune"):
+                self.n_probe = tune_n_probe(self, self.target_recall)
+        return self
+
+    def _set_lists(self, labels, n_lists):
+        # Store the inverted lists CSR-style: rows grouped by list, plus list boundaries
+        self.labels = labels
+        self.order = np.argsort(labels, kind='stable').astype(np.int64)
+        self.offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=n_lists), out=self.offsets[1:])
+
+    def _candidates(self, vector, n_probe, min_count):
+        centroid_scores = np.asarray(self.centroids @ _dense_row(vector)).ravel()
+        ranked = np.argsort(-centroid_scores)
+        sizes = self.offsets[ranked + 1] - self.offsets[ranked]
+        # Probe at least n_probe lists, and more if they hold too few rows to fill top-k
+        n_lists = max(n_probe, int(np.searchsorted(np.cumsum(sizes), min_count)) + 1)
+        lists = ranked[:n_lists]
+        return np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists] + [self.pending])
+
+    def query(self, vector, k, n_probe=None, exclude=None):
+        """Approximate top-k (positions, scores) for an already normalized query vector."""
+        n_probe = n_probe or self.n_probe
+        candidates = self._candidates(vector, n_probe, k + (exclude is not None))
+        scores = self.features[candidates] @ _column(vector)
+        if sparse.issparse(scores):
+            scores = scores.toarray()
+        scores = np.asarray(scores).ravel()
+        local_exclude = np.flatnonzero(candidates == exclude) if exclude is not None else None
+        top = top_k_indices(scores, k, exclude=local_exclude)
+        return candidates[top], scores[top]
+
+    def appended(self, features, start):
+        """
+        A copy of the index over features, whose rows from start onwards are new.
+        New rows are assigned to their nearest centroid and held in a pending list that every
+        query scans; the inverted lists are rebuilt only once the pending list grows large.
+        """
+        index = copy.copy(self)
+        index.features = features
+        if features.shape[1] > self.centroids.shape[1]:
+            # New feature columns (e.g. unseen tokens) are zero in every centroid
+            padding = np.zeros((self.centroids.shape[0], features.shape[1] - self.centroids.shape[1]), dtype=np.float32)
+            index.centroids = np.hstack([self.centroids, padding])
+        new_rows = np.arange(start, features.shape[0], dtype=np.int64)
+        assigned = np.asarray(features[new_rows] @ index.centroids.T).argmax(axis=1)
+        index.labels = np.concatenate([self.labels, assigned])
+        index.pending = np.concatenate([self.pending, new_rows])
+        if len(index.pending) > PENDING_FRACTION * len(index.labels):
+            index._set_lists(index.labels, len(index.offsets) - 1)
+            index.pending = np.empty(0, dtype=np.int64)
+        return index
+
+    def query_row(self, row, k, n_probe=None):
+        """Approximate top-k neighbours of an indexed row, excluding the row itself."""
+        return self.query(self.features[row], k, n_probe=n_probe, exclude=row)
+
+def _dense_row(vector):
+    if sparse.issparse(vector):
+        vector = vector.toarray()
+    return np.asarray(vector, dtype=np.float32).ravel()
+
+def _column(vector):
+    if sparse.issparse(vector):
+        return vector.T
+    return np.asarray(vector).ravel()
+
+def build_ann_index(normalized, min_rows=ANN_MIN_ROWS, **kwargs):
+    """Fit an IVFIndex when the matrix is large enough to benefit, otherwise None."""
+    if normalized.shape[0] < min_rows:
+        return None
+    with span("ann_index_build"):
+        return IVFIndex(**kwargs).fit(normalized)
+
+def tune_n_probe(index: IVFIndex, target=TARGET_RECALL, k=TUNE_K, n_queries=TUNE_QUERIES, random_state=0):
+    """
+    Smallest n_probe, doubling from DEFAULT_N_PROBE, whose recall@k on sampled rows reaches
+    target against brute force. How far to probe depends on how well the data clusters,
+    so a fixed default is too low for some datasets and wasted on others.
+    """
+    features = index.features
+    n_lists = len(index.offsets) - 1
+    rng = np.random.default_rng(random_state)
+    rows = rng.choice(features.shape[0], size=min(n_queries, features.shape[0]), replace=False)
+    exact = [top_k_indices(similarity_row(features, row), k, exclude=row) for row in rows]
+    expected = sum(len(e) for e in exact)
+    n_probe = min(DEFAULT_N_PROBE, n_lists)
+    while n_probe < n_lists:
+        hits = sum(len(np.intersect1d(e, index.query_row(row, k, n_probe=n_probe)[0])) for row, e in zip(rows, exact))
+        if hits >= target * expected:
+            break
+        n_probe = min(2 * n_probe, n_lists)
+    return n_probe
+
+def recall_at_k(index: IVFIndex, k=10, n_queries=200, n_probe=None, random_state=0):
+    """
+    Compare approximate neighbours with the exact brute-force path on sampled rows.
+    Returns mean recall@k and mean per-query latency of both paths in milliseconds.
+    """
+    features = index.features
+    rng = np.random.default_rng(random_state)
+    rows = rng.choice(features.shape[0], size=min(n_queries, features.shape[0]), replace=False)
+    hits = 0
+    exact_time = ann_time = 0.0
+    for row in rows:
+        start = time.perf_counter()
+        exact = top_k_indices(similarity_row(features, row), k, exclude=row)
+        exact_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        approx, _ = index.query_row(row, k, n_probe=n_probe)
+        ann_time += time.perf_counter() - start
+
+        hits += len(np.intersect1d(exact, approx))
+    expected = sum(min(k, features.shape[0] - 1) for _ in rows)
+    return {
+        "k": k,
+        "n_probe": n_probe or index.n_probe,
+        "n_lists": len(index.offsets) - 1,
+        "queries": len(rows),
+        "recall": hits / expected if expected else 1.0,
+        "exact_ms": 1000 * exact_time / max(len(rows), 1),
+        "ann_ms": 1000 * ann_time / max(len(rows), 1),
+    }
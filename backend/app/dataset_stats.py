@@ -0,0 +1,191 @@
+import math
+import numpy as np
+import pandas as pd
+
+# Number of most frequent values reported per non-numeric column
+TOP_N = 10
+# Columns with at most this many distinct values keep full value counts, so appends stay exact
+TRACK_LIMIT = 1000
+# Other columns keep a distinct-value sketch for merging unique counts: the exact set of value
+# hashes up to this many, then a HyperLogLog with 2**HLL_PRECISION registers (~1.6% error)
+DISTINCT_EXACT_LIMIT = 1000
+HLL_PRECISION = 12
+
+def _clean(value):
+    """Plain Python scalar for JSON; NaN becomes None."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+def _top(counts: dict):
+    ordered = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))[:TOP_N]
+    return {k: v for k, v in ordered}
+
+def _value_hashes(series: pd.Series):
+    """Distinct 64-bit hashes of a column's non-missing values, independent of the integer width."""
+    series = series.dropna()
+    if pd.api.types.is_numeric_dtype(series):
+        values = series.to_numpy(dtype=np.float64)
+    else:
+        values = series.astype(str).to_numpy(dtype=object)
+    return np.unique(pd.util.hash_array(values))
+
+def _hll_registers(hashes):
+    """HyperLogLog registers: the top bits pick a register, which keeps the longest run of leading zeros."""
+    tail_bits = 64 - HLL_PRECISION
+    index = (hashes >> np.uint64(tail_bits)).astype(np.int64)
+    tail = hashes & np.uint64((1 << tail_bits) - 1)
+    # tail < 2**52, so its bit length is exact in float64
+    bit_length = np.zeros(len(tail), dtype=np.int64)
+    nonzero = tail > 0
+    bit_length[nonzero] = np.floor(np.log2(tail[nonzero].astype(np.float64))).astype(np.int64) + 1
+    registers = np.zeros(1 << HLL_PRECISION, dtype=np.int64)
+    np.maximum.at(registers, index, tail_bits - bit_length + 1)
+    return registers
+
+def _hll_estimate(registers):
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        # Small-range correction: linear counting over the empty registers
+        return m * math.log(m / zeros)
+    return estimate
+
+def _sketch(hashes):
+    if len(hashes) <= DISTINCT_EXACT_LIMIT:
+        return {"hashes": hashes.tolist()}
+    return {"hll": _hll_registers(hashes).tolist()}
+
+def _merge_sketch(sketch: dict, hashes):
+    """(merged sketch, distinct values added) after adding hashes to sketch."""
+    if "hashes" in sketch:
+        old = np.asarray(sketch["hashes"], dtype=np.uint64)
+        union = np.union1d(old, hashes)
+        return _sketch(union), len(union) - len(old)
+    old = np.asarray(sketch["hll"], dtype=np.int64)
+    merged = np.maximum(old, _hll_registers(hashes))
+    return {"hll": merged.tolist()}, max(0, int(round(_hll_estimate(merged) - _hll_estimate(old))))
+
+def _numeric_columns(df: pd.DataFrame):
+    return df.select_dtypes(include=['number']).columns.tolist()
+
+def compute_stats(df: pd.DataFrame):
+    """
+    Per-column statistics for the summary endpoints, computed once at ingest:
+    dtypes, missing and unique counts, min/max/mean for numeric columns and
+    the most frequent values of the rest.
+    """
+    numeric_cols = _numeric_columns(df)
+    numeric = {}
+    if numeric_cols:
+        agg = df[numeric_cols].agg(['min', 'max', 'sum', 'count'])
+        for col in numeric_cols:
+            count = int(agg.at['count', col])
+            total = _clean(agg.at['sum', col])
+            numeric[col] = {
+                "min": _clean(agg.at['min', col]),
+                "max": _clean(agg.at['max', col]),
+                "sum": total,
+                "count": count,
+                "mean": total / count if count else None,
+            }
+
+    value_counts = {}
+    top_values = {}
+    distinct = {}
+    unique_counts = {c: int(n) for c, n in df.nunique().items()}
+    for col in df.columns:
+        if col not in numeric:
+            # Categoricals also list categories with no rows; leave those out
+            counts = {str(k): int(v) for k, v in df[col].value_counts().items() if v}
+            top_values[col] = _top(counts)
+            if unique_counts[col] <= TRACK_LIMIT:
+                value_counts[col] = counts
+                continue
+        distinct[col] = _sketch(_value_hashes(df[col]))
+
+    return {
+        "shape": [int(df.shape[0]), int(df.shape[1])],
+        "columns": list(df.columns),
+        "dtypes": {c: str(t) for c, t in df.dtypes.items()},
+        "missing": {c: int(n) for c, n in df.isnull().sum().items()},
+        "unique_counts": unique_counts,
+        "numeric": numeric,
+        "top_values": top_values,
+        "_value_counts": value_counts,
+        "_distinct": distinct,
+    }
+
+def merge_stats(stats: dict, old_df: pd.DataFrame, new_rows: pd.DataFrame):
+    """
+    Update stats computed for old_df so they describe old_df followed by new_rows.
+    Work is proportional to the new rows: tracked columns merge their value counts and the
+    others their distinct-value sketches. old_df is only read for a column whose stats were
+    saved before sketches existed, once, to build its sketch.
+    """
+    new_stats = compute_stats(new_rows)
+    merged = {
+        "shape": [stats["shape"][0] + len(new_rows), stats["shape"][1]],
+        "columns": stats["columns"],
+        "dtypes": stats["dtypes"],
+        "missing": {c: stats["missing"][c] + new_stats["missing"].get(c, 0) for c in stats["columns"]},
+        "unique_counts": {},
+        "numeric": {},
+        "top_values": {},
+        "_value_counts": {},
+        "_distinct": {},
+    }
+
+    for col, old in stats["numeric"].items():
+        new = new_stats["numeric"].get(col)
+        if new is None or new["count"] == 0:
+            merged["numeric"][col] = old
+            continue
+        count = old["count"] + new["count"]
+        total = (old["sum"] or 0) + new["sum"]
+        mins = [v for v in (old["min"], new["min"]) if v is not None]
+        maxs = [v for v in (old["max"], new["max"]) if v is not None]
+        merged["numeric"][col] = {"min": min(mins), "max": max(maxs), "sum": total,
+                                  "count": count, "mean": total / count}
+
+    for col in stats["columns"]:
+        if col in stats["_value_counts"]:
+            counts = dict(stats["_value_counts"][col])
+            for value, n in new_rows[col].value_counts().items():
+                if not n:
+                    continue
+                counts[str(value)] = counts.get(str(value), 0) + int(n)
+            merged["unique_counts"][col] = len(counts)
+            if len(counts) <= TRACK_LIMIT:
+                merged["_value_counts"][col] = counts
+            else:
+                # Outgrew tracking; later appends merge a sketch of the values seen so far
+                merged["_distinct"][col] = _sketch(_value_hashes(pd.Series(list(counts), dtype=object)))
+            if col in stats["top_values"]:
+                merged["top_values"][col] = _top(counts)
+            continue
+
+        sketch = stats.get("_distinct", {}).get(col)
+        if sketch is None:
+            sketch = _sketch(_value_hashes(old_df[col]))
+        new_values = new_rows[col]
+        if stats["dtypes"].get(col) == "float32":
+            # Hash appended values at the precision the stored column holds them
+            new_values = new_values.astype(np.float32)
+        merged["_distinct"][col], added = _merge_sketch(sketch, _value_hashes(new_values))
+        merged["unique_counts"][col] = stats["unique_counts"][col] + added
+        if col in stats["top_values"]:
+            # Untracked column: merge the truncated lists, which keeps the top values approximate
+            counts = dict(stats["top_values"][col])
+            for value, n in new_stats["top_values"].get(col, {}).items():
+                counts[value] = counts.get(value, 0) + n
+            merged["top_values"][col] = _top(counts)
+    return merged
+
+def public_stats(stats: dict):
+    """Stats without the internal bookkeeping used for merging."""
+    return {k: v for k, v in stats.items() if not k.startswith("_")}
@@ -0,0 +1,168 @@
+import json
+import os
+import re
+import time
+import pandas as pd
+from schema import concat_compact
+from shared_state import file_lock
+
+_NAME_RE = re.compile(r'^[A-Za-z0-9_\-]+$')
+
+def dataset_name_for(filename: str):
+    """Registry name derived from an uploaded file name, e.g. 'snu friendship.csv' -> 'snu_friendship'."""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    name = re.sub(r'[^A-Za-z0-9_\-]+', '_', stem).strip('_')
+    return name or "dataset"
+
+class DatasetStore:
+    """
+    Named datasets kept as uncompressed Arrow IPC files under one directory, plus a JSON
+    registry recording each dataset's shape and version and which one is active.
+    Files are memory-mapped on load, so a restart re-opens data instead of re-parsing CSV.
+    """
+    def __init__(self, root: str):
+        self.root = root
+        self.registry_path = os.path.join(root, "datasets.json")
+        # Held around every registry read-modify-write, so workers sharing root do not
+        # overwrite each other's entries or allocate the same part file
+        self.lock_path = os.path.join(root, "datasets.lock")
+        os.makedirs(root, exist_ok=True)
+
+    def _read_registry(self):
+        if not os.path.exists(self.registry_path):
+            return {"active": None, "datasets": {}}
+        with open(self.registry_path) as f:
+            return json.load(f)
+
+    def _write_registry(self, registry):
+        tmp = f"{self.registry_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(registry, f, indent=2)
+        os.replace(tmp, self.registry_path)
+
+    def path_for(self, name: str):
+        return os.path.join(self.root, f"{name}.arrow")
+
+    def knn_path_for(self, name: str, kind: str):
+        """Directory holding the precomputed neighbour table of one of a dataset's models."""
+        return os.path.join(self.root, f"{name}.knn-{kind}")
+
+    def save(self, name: str, df: pd.DataFrame, source: str = None, activate=True, stats: dict = None):
+        """
+        Write df under name (replacing any previous version) and return its registry entry.
+        Ingest-time statistics, if given, are stored next to the data.
+        """
+        if not _NAME_RE.match(name):
+            raise ValueError(f"Invalid dataset name: {name!r}")
+        path = self.path_for(name)
+        with file_lock(self.lock_path):
+            self._write_table(df, path)
+            if stats is not None:
+                self.save_stats(name, stats)
+
+            registry = self._read_registry()
+            previous = registry["datasets"].get(name, {})
+            entry = {
+                "file": os.path.basename(path),
+                "source": source or previous.get("source"),
+                "rows": int(df.shape[0]),
+                "cols": int(df.shape[1]),
+                "version": previous.get("version", 0) + 1,
+                "saved_at": time.time(),
+                "parts": [],
+            }
+            for part in previous.get("parts", []):
+                try:
+                    os.remove(os.path.join(self.root, part))
+                except FileNotFoundError:
+                    pass
+            registry["datasets"][name] = entry
+            if activate:
+                registry["active"] = name
+            self._write_registry(registry)
+        return entry
+
+    def _write_table(self, df: pd.DataFrame, path: str):
+        import pyarrow as pa
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        tmp = path + ".tmp"
+        with pa.OSFile(tmp, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, path)
+
+    def append(self, name: str, new_rows: pd.DataFrame, stats: dict = None):
+        """
+        Add rows to a stored dataset as a separate part file, so the existing data is not
+        rewritten. Returns the updated registry entry with its version bumped.
+        """
+        with file_lock(self.lock_path):
+            registry = self._read_registry()
+            entry = registry["datasets"].get(name)
+            if entry is None:
+                raise KeyError(name)
+            parts = entry.get("parts", [])
+            # Named after the version it creates, which only this holder of the lock can claim
+            part = f"{name}.v{entry['version'] + 1:06d}.part.arrow"
+            self._write_table(new_rows, os.path.join(self.root, part))
+            if stats is not None:
+                self.save_stats(name, stats)
+            entry = dict(entry, parts=parts + [part], rows=entry["rows"] + int(len(new_rows)),
+                         version=entry["version"] + 1, saved_at=time.time())
+            registry["datasets"][name] = entry
+            self._write_registry(registry)
+        return entry
+
+    def load(self, name: str):
+        """Memory-map a stored dataset (and any appended parts) back into a DataFrame."""
+        import pyarrow as pa
+        entry = self.get(name)
+        if entry is None:
+            raise KeyError(name)
+        tables = []
+        for file in [entry["file"]] + entry.get("parts", []):
+            source = pa.memory_map(os.path.join(self.root, file), "r")
+            tables.append(pa.ipc.open_file(source).read_all())
+        if len(tables) == 1:
+            return tables[0].to_pandas()
+        try:
+            return pa.concat_tables(tables, promote_options="permissive").to_pandas()
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # An append widened a compacted column (e.g. more categories than its codes held)
+            df = tables[0].to_pandas()
+            for table in tables[1:]:
+                df = concat_compact(df, table.to_pandas())
+            return df
+
+    def save_stats(self, name: str, stats: dict):
+        path = os.path.join(self.root, f"{name}.stats.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(stats, f)
+        os.replace(path + ".tmp", path)
+
+    def load_stats(self, name: str):
+        """Stored statistics for a dataset, or None if it was saved without them."""
+        path = os.path.join(self.root, f"{name}.stats.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def get(self, name: str):
+        return self._read_registry()["datasets"].get(name)
+
+    def list(self):
+        return self._read_registry()
+
+    def activate(self, name: str):
+        with file_lock(self.lock_path):
+            registry = self._read_registry()
+            if name not in registry["datasets"]:
+                raise KeyError(name)
+            registry["active"] = name
+            self._write_registry(registry)
+        return registry["datasets"][name]
+
+    @property
+    def active(self):
+        return self._read_registry()["active"]
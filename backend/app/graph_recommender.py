@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from similarity import top_k_indices
+from metrics import span
+
+GRAPH_METHODS = ['common_neighbors', 'adamic_adar', 'ppr']
+# Rows whose 2-hop scores are computed together when precomputing candidates
+PRECOMPUTE_BLOCK_ROWS = 1024
+# Candidates kept per user by precompute_candidates
+MAX_CANDIDATES = 50
+PPR_ALPHA = 0.15
+PPR_TOL = 1e-6
+PPR_MAX_ITER = 100
+
+class GraphModel:
+    """
+    Undirected friendship graph over every person in a User/Friend edge list.
+    adjacency is a symmetric 0/1 CSR matrix without self-loops; labels[i] names node i.
+    candidates caches precomputed 2-hop lists per method; see precompute_candidates.
+    """
+    def __init__(self, labels: pd.Index, adjacency):
+        self.labels = labels
+        self.adjacency = adjacency
+        self.degrees = np.asarray(adjacency.sum(axis=1)).ravel()
+        # Adamic-Adar weight of each common neighbour; degree-1 nodes cannot be one
+        with np.errstate(divide='ignore'):
+            self.aa_weights = np.where(self.degrees > 1, 1.0 / np.log(np.maximum(self.degrees, 2)), 0.0)
+        # Column-stochastic random-walk matrix, so one PPR step is a single product
+        inverse = np.divide(1.0, self.degrees, out=np.zeros_like(self.degrees, dtype=np.float64), where=self.degrees > 0)
+        self.walk = (adjacency @ sparse.diags(inverse)).tocsr()
+        self.candidates = {}
+
+    def neighbours(self, row):
+        return self.adjacency.indices[self.adjacency.indptr[row]:self.adjacency.indptr[row + 1]]
+
+    def appended(self, new_rows: pd.DataFrame):
+        """
+        A copy of this graph with new_rows' edges added; new people get nodes at the end.
+        Precomputed candidates are recomputed only for people whose friend list grew and
+        their neighbours, the only rows whose 2-hop scores or exclusions can change.
+        """
+        users = new_rows['User'].astype(str)
+        friends = new_rows['Friend'].astype(str)
+        seen = pd.Index(pd.unique(pd.concat([users, friends], ignore_index=True)))
+        labels = self.labels.append(seen.difference(self.labels, sort=False))
+        n_nodes = len(labels)
+        rows = labels.get_indexer(users)
+        cols = labels.get_indexer(friends)
+        keep = rows != cols
+        rows, cols = rows[keep], cols[keep]
+        old = self.adjacency
+        old = sparse.csr_matrix((old.data, old.indices, old.indptr), shape=(old.shape[0], n_nodes))
+        old = sparse.vstack([old, sparse.csr_matrix((n_nodes - old.shape[0], n_nodes), dtype=np.float32)], format='csr')
+        delta = sparse.csr_matrix((np.ones(2 * len(rows), dtype=np.float32),
+                                   (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+                                  shape=(n_nodes, n_nodes))
+        adjacency = (old + delta).tocsr()
+        adjacency.data[:] = 1
+        model = GraphModel(labels, adjacency)
+        touched = np.flatnonzero(np.diff(adjacency.indptr) != np.diff(old.indptr))
+        affected = np.union1d(touched, adjacency[touched].indices)
+        for method, cached in self.candidates.items():
+            model.candidates[method] = _refresh_candidates(model, method, cached, affected)
+        return model
+
+def build_graph_model(df: pd.DataFrame):
+    """Symmetric adjacency of the User/Friend edges; repeated edges and self-loops are dropped."""
+    with span("graph_build"):
+        users = df['User'].astype(str)
+        friends = df['Friend'].astype(str)
+        labels = pd.Index(pd.unique(pd.concat([users, friends], ignore_index=True))).sort_values()
+        rows = labels.get_indexer(users)
+        cols = labels.get_indexer(friends)
+        keep = rows != cols
+        rows, cols = rows[keep], cols[keep]
+        data = np.ones(2 * len(rows), dtype=np.float32)
+        adjacency = sparse.csr_matrix((data, (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+                                      shape=(len(labels), len(labels)))
+        adjacency.sum_duplicates()
+        adjacency.data[:] = 1
+        return GraphModel(labels, adjacency)
+
+def _two_hop(model: GraphModel, rows, method):
+    """Sparse 2-hop scores for rows: shared neighbours, optionally weighted by Adamic-Adar."""
+    start = model.adjacency[rows]
+    if method == 'adamic_adar':
+        start = start @ sparse.diags(model.aa_weights)
+    return (start @ model.adjacency).tocsr()
+
+def personalized_pagerank(model: GraphModel, row, alpha=PPR_ALPHA, tol=PPR_TOL, max_iter=PPR_MAX_ITER):
+    """Stationary distribution of a random walk that restarts at row with probability alpha."""
+    restart = np.zeros(len(model.labels))
+    restart[row] = 1.0
+    scores = restart.copy()
+    for _ in range(max_iter):
+        updated = alpha * restart + (1 - alpha) * (model.walk @ scores)
+        converged = np.abs(updated - scores).sum() < tol
+        scores = updated
+        if converged:
+            break
+    return scores
+
+def _exclude(model: GraphModel, row):
+    return np.concatenate([[row], model.neighbours(row)])
+
+def _top_sparse(nodes, scores, excluded, top_k):
+    """Best top_k of a sparse score row, skipping excluded nodes and non-positive scores."""
+    keep = ~np.isin(nodes, excluded) & (scores > 0)
+    nodes, scores = nodes[keep], scores[keep]
+    # Ties go to the lower node id, as with the dense scorers
+    order = np.argsort(nodes, kind='stable')
+    nodes, scores = nodes[order], scores[order]
+    top = top_k_indices(scores, top_k)
+    return nodes[top], scores[top]
+
+def score_candidates(model: GraphModel, row, method, top_k):
+    """(nodes, scores) of the top_k people row is not yet friends with."""
+    cached = model.candidates.get(method)
+    if cached is not None and top_k <= cached["max_candidates"]:
+        start = cached["indptr"][row]
+        end = min(cached["indptr"][row + 1], start + top_k)
+        return cached["nodes"][start:end], cached["scores"][start:end]
+    excluded = _exclude(model, row)
+    if method == 'ppr':
+        with span("ppr"):
+            scores = personalized_pagerank(model, row)
+        nodes = np.flatnonzero(scores)
+        with span("sort"):
+            return _top_sparse(nodes, scores[nodes], excluded, top_k)
+    with span("two_hop"):
+        two_hop = _two_hop(model, [row], method)
+    with span("sort"):
+        return _top_sparse(two_hop.indices, two_hop.data, excluded, top_k)
+
+def _candidate_lists(model: GraphModel, rows, method, max_candidates, block_rows):
+    """(row, nodes, scores) with the best 2-hop candidates of each of rows, scored in blocks."""
+    for start in range(0, len(rows), block_rows):
+        block_of = rows[start:start + block_rows]
+        block = _two_hop(model, block_of, method)
+        # Drop each user and their current friends from their own row in one go
+        known = model.adjacency[block_of] + sparse.csr_matrix(
+            (np.ones(len(block_of)), (np.arange(len(block_of)), block_of)), shape=block.shape)
+        block = (block - block.multiply(known > 0)).tocsr()
+        block.eliminate_zeros()
+        for i, row in enumerate(block_of):
+            segment = slice(block.indptr[i], block.indptr[i + 1])
+            nodes, scores = _top_sparse(block.indices[segment], block.data[segment], (), max_candidates)
+            yield row, nodes, scores
+
+def _pack_candidates(n_nodes, max_candidates, row_parts, node_parts, score_parts):
+    """Candidate lists grouped by row into the indptr/nodes/scores layout score_candidates reads."""
+    rows = np.concatenate(row_parts or [np.empty(0)]).astype(np.int64)
+    # Stable, so each row's candidates stay best first
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_nodes), out=indptr[1:])
+    return {
+        "max_candidates": max_candidates,
+        "indptr": indptr,
+        "nodes": np.concatenate(node_parts or [np.empty(0)]).astype(np.int64)[order],
+        "scores": np.concatenate(score_parts or [np.empty(0)]).astype(np.float32)[order],
+    }
+
+def precompute_candidates(model: GraphModel, method='adamic_adar', max_candidates=MAX_CANDIDATES,
+                          block_rows=PRECOMPUTE_BLOCK_ROWS):
+    """
+    Compute every user's best 2-hop candidates in row blocks of sparse products and cache
+    them on the model, so graph recommendations become a slice lookup. Row r's candidates,
+    best first, are nodes[indptr[r]:indptr[r+1]].
+    """
+    if method not in ('common_neighbors', 'adamic_adar'):
+        raise ValueError(f"Only 2-hop methods can be precomputed, not {method!r}")
+    n_nodes = len(model.labels)
+    row_parts, node_parts, score_parts = [], [], []
+    with span("two_hop_precompute"):
+        for row, nodes, scores in _candidate_lists(model, np.arange(n_nodes), method, max_candidates, block_rows):
+            row_parts.append(np.full(len(nodes), row))
+            node_parts.append(nodes)
+            score_parts.append(scores)
+    model.candidates[method] = _pack_candidates(n_nodes, max_candidates, row_parts, node_parts, score_parts)
+    return model
+
+def _refresh_candidates(model: GraphModel, method, cached, rows, block_rows=PRECOMPUTE_BLOCK_ROWS):
+    """cached candidate lists carried over to model (which may have more nodes), with rows recomputed."""
+    old_rows = np.repeat(np.arange(len(cached["indptr"]) - 1), np.diff(cached["indptr"]))
+    keep = ~np.isin(old_rows, rows)
+    row_parts, node_parts, score_parts = [old_rows[keep]], [cached["nodes"][keep]], [cached["scores"][keep]]
+    with span("two_hop_precompute"):
+        for row, nodes, scores in _candidate_lists(model, rows, method, cached["max_candidates"], block_rows):
+            row_parts.append(np.full(len(nodes), row))
+            node_parts.append(nodes)
+            score_parts.append(scores)
+    return _pack_candidates(len(model.labels), cached["max_candidates"], row_parts, node_parts, score_parts)
+
+def graph_recommendations(model: GraphModel, user_id, top_k=5, method='adamic_adar'):
+    """
+    Friend-of-friend suggestions for user_id that exclude people they are already friends
+    with, ranked by common neighbours, Adamic-Adar or personalized PageRank.
+    """
+    if method not in GRAPH_METHODS:
+        raise ValueError(f"Unknown graph method {method!r}; expected one of {GRAPH_METHODS}")
+    user_id = str(user_id)
+    if user_id not in model.labels:
+        return []
+    row = model.labels.get_loc(user_id)
+    nodes, _ = score_candidates(model, row, method, top_k)
+    return model.labels[nodes].tolist()
@@ -1,73 +1,261 @@
+import copy
 import pandas as pd
-from sklearn.preprocessing import OneHotEncoder, StandardScaler, LabelEncoder
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.neighbors import NearestNeighbors
+from sklearn.preprocessing import StandardScaler
+from scipy import sparse
 import numpy as np
+from similarity import l2_normalize
+from ann import build_ann_index
+from knn_table import neighbour_blocks, neighbours_of
+from metrics import span
+
+NUMERIC_COLS = ['age', 'height', 'weight', 'spice_tolerance', 'social_media_hours']
+CATEGORICAL_COLS = ['favorite_cuisines', 'movie_genres', 'series_genres', 'gaming_platforms',
+                    'music_genres', 'reading_genres', 'shopping_preferences', 'travel_destinations',
+                    'hobbies', 'clubs']
+# List columns whose entries can be recommended back to users
+ITEM_COLS = ['hobbies', 'clubs']
+
+def is_lifestyle_data(df: pd.DataFrame):
+    """True if the dataset has every column the hobby recommender needs."""
+    return 'user_id' in df.columns and all(c in df.columns for c in NUMERIC_COLS + CATEGORICAL_COLS)
+
+def encode_list_column(series: pd.Series, vocab: pd.Index = None):
+    """
+    Tokenize a comma-joined list column into a multi-hot CSR matrix, one row per entry.
+    Token ids come from vocab, which is extended with any unseen tokens and returned.
+    Each row keeps its tokens in their original order.
+    """
+    series = series.reset_index(drop=True)
+    tokens = series.fillna('').astype(str).str.split(',').explode().str.strip()
+    tokens = tokens[tokens != '']
+
+    vocab = pd.Index([], dtype=object) if vocab is None else vocab
+    unseen = pd.Index(tokens.unique()).difference(vocab, sort=False)
+    if len(unseen):
+        vocab = vocab.append(unseen)
+    codes = vocab.get_indexer(tokens.to_numpy())
+
+    indptr = np.zeros(len(series) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tokens.index.to_numpy(dtype=np.int64), minlength=len(series)), out=indptr[1:])
+    data = np.ones(len(codes), dtype=np.float32)
+    matrix = sparse.csr_matrix((data, codes, indptr), shape=(len(series), len(vocab)))
+    return matrix, vocab
+
+def _binary(matrix):
+    """Collapse repeated tokens so every multi-hot entry is exactly 1."""
+    matrix = matrix.copy()
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix
 
 def preprocess_lifestyle_data(df: pd.DataFrame):
     """
     Preprocess the lifestyle dataset for hobby recommendations.
-    Handles one-hot encoding for categorical features, normalization for numeric.
+    Handles multi-hot encoding for list columns, normalization for numeric.
+    Returns a sparse float32 feature matrix, the per-column vocabularies and the fitted scaler.
     """
-    # Identify column types
-    numeric_cols = ['age', 'height', 'weight', 'spice_tolerance', 'social_media_hours']
-    categorical_cols = ['favorite_cuisines', 'movie_genres', 'series_genres', 'gaming_platforms',
-                       'music_genres', 'reading_genres', 'shopping_preferences', 'travel_destinations',
-                       'hobbies', 'clubs']
-
     # Handle missing values
-    df = df.fillna('')
+    df = df[NUMERIC_COLS + CATEGORICAL_COLS].reset_index(drop=True).fillna('')
 
-    # One-hot encode categorical columns
-    encoder = OneHotEncoder(sparse_output=False, handle_unknown='ignore')
-    encoded_cats = encoder.fit_transform(df[categorical_cols])
-    encoded_cat_df = pd.DataFrame(encoded_cats, columns=encoder.get_feature_names_out(categorical_cols))
+    # Multi-hot encode each list column on its individual tokens, not whole strings
+    vocabularies = {}
+    blocks = []
+    for col in CATEGORICAL_COLS:
+        encoded, vocabularies[col] = encode_list_column(df[col])
+        blocks.append(_binary(encoded))
 
     # Normalize numeric columns
     scaler = StandardScaler()
-    scaled_nums = scaler.fit_transform(df[numeric_cols])
-    scaled_num_df = pd.DataFrame(scaled_nums, columns=numeric_cols)
+    scaled_nums = scaler.fit_transform(df[NUMERIC_COLS]).astype(np.float32)
 
     # Combine processed features
-    processed_df = pd.concat([scaled_num_df, encoded_cat_df], axis=1)
+    features = sparse.hstack([sparse.csr_matrix(scaled_nums)] + blocks, format='csr', dtype=np.float32)
+    return features, vocabularies, scaler
 
-    return processed_df, encoder, scaler
+def _concat_columns(blocks, mapping, width):
+    """
+    Place per-column blocks side by side, then renumber their columns through mapping
+    into a matrix of the given width. Each row keeps its entries in block order.
+    """
+    stacked = sparse.hstack(blocks, format='csr')
+    return sparse.csr_matrix((stacked.data, mapping[stacked.indices], stacked.indptr),
+                             shape=(stacked.shape[0], width))
 
-def recommend_hobbies(df: pd.DataFrame, user_id, top_k=5):
+class HobbyFeatureModel:
     """
-    Recommend new hobbies/clubs for a user based on similar users' preferences.
+    Fitted vocabularies, scaler and L2-normalized sparse feature matrix for one lifestyle
+    dataset. Built once when the data is ingested and reused by every recommendation request.
+
+    items is a CSR matrix of each user's hobbies and clubs as integer ids into item_names;
+    row r's ids, in their original order, are items.indices[items.indptr[r]:items.indptr[r+1]].
     """
-    # Preprocess data
-    processed_df, encoder, scaler = preprocess_lifestyle_data(df)
+    # Precomputed all-pairs neighbour table (see knn_table), attached after the model is built
+    knn = None
+    # Appends never change the vectors of rows already in the model
+    updated_rows = ()
+
+    def __init__(self, df: pd.DataFrame, features, vocabularies, scaler, with_index=True):
+        self.features = features
+        self.vocabularies = dict(vocabularies)
+        self.scaler = scaler
+        self.user_ids = df['user_id'].to_numpy()
+        self.row_of = {}
+        for row, uid in enumerate(self.user_ids.tolist()):
+            self.row_of.setdefault(uid, row)
+        self.rows_at_fit = len(self.user_ids)
+
+        # Feature column of every token: numeric columns first, then each list column's vocabulary.
+        # Tokens first seen in appended rows get new columns at the end.
+        self.token_columns = {}
+        width = len(NUMERIC_COLS)
+        for col in CATEGORICAL_COLS:
+            self.token_columns[col] = np.arange(width, width + len(vocabularies[col]))
+            width += len(vocabularies[col])
+
+        # Hobbies and clubs share one id space: hobby ids first, then clubs
+        self.item_ids = {}
+        n_items = 0
+        for col in ITEM_COLS:
+            self.item_ids[col] = np.arange(n_items, n_items + len(vocabularies[col]))
+            n_items += len(vocabularies[col])
+        self.item_names = np.array([name for col in ITEM_COLS for name in vocabularies[col]], dtype=object)
+        self.items = self._encode_items(df)
+        self.index = build_ann_index(features) if with_index else None
+
+    def items_of(self, row):
+        return self.items.indices[self.items.indptr[row]:self.items.indptr[row + 1]]
 
-    # Find similar users using cosine similarity
-    sim_matrix = cosine_similarity(processed_df)
-    sim_df = pd.DataFrame(sim_matrix, index=df['user_id'], columns=df['user_id'])
+    def _encode_tokens(self, df: pd.DataFrame, col):
+        """Encode a list column with this model's vocabulary, registering any unseen tokens."""
+        matrix, vocab = encode_list_column(df[col], self.vocabularies[col])
+        n_new = len(vocab) - len(self.vocabularies[col])
+        if n_new:
+            self.vocabularies[col] = vocab
+            width = len(NUMERIC_COLS) + sum(len(c) for c in self.token_columns.values())
+            self.token_columns[col] = np.concatenate([self.token_columns[col], np.arange(width, width + n_new)])
+            if col in self.item_ids:
+                self.item_ids[col] = np.concatenate([self.item_ids[col],
+                                                     np.arange(len(self.item_names), len(self.item_names) + n_new)])
+                self.item_names = np.concatenate([self.item_names, np.array(list(vocab[-n_new:]), dtype=object)])
+        return matrix
+
+    def _encode_items(self, df: pd.DataFrame):
+        blocks = [self._encode_tokens(df, col) for col in ITEM_COLS]
+        mapping = np.concatenate([self.item_ids[col] for col in ITEM_COLS])
+        return _concat_columns(blocks, mapping, len(self.item_names))
+
+    def _encode_features(self, df: pd.DataFrame):
+        blocks = [_binary(self._encode_tokens(df, col)) for col in CATEGORICAL_COLS]
+        scaled_nums = self.scaler.transform(df[NUMERIC_COLS]).astype(np.float32)
+        mapping = np.concatenate([np.arange(len(NUMERIC_COLS))] + [self.token_columns[c] for c in CATEGORICAL_COLS])
+        width = len(NUMERIC_COLS) + sum(len(c) for c in self.token_columns.values())
+        return l2_normalize(_concat_columns([sparse.csr_matrix(scaled_nums)] + blocks, mapping, width))
+
+    def appended(self, new_rows: pd.DataFrame):
+        """
+        A copy of this model with new_rows added at the end. Only the new rows are encoded:
+        the scaler statistics are updated with partial_fit, new tokens get new feature
+        columns and the new rows are added to the existing index buckets. Existing rows keep
+        the scaling they were fitted with, so callers should refit once the data has grown a lot
+        (see needs_refit).
+        """
+        model = copy.copy(self)
+        model.knn = None
+        model.vocabularies = dict(self.vocabularies)
+        model.token_columns = dict(self.token_columns)
+        model.item_ids = dict(self.item_ids)
+        model.scaler = copy.deepcopy(self.scaler)
+
+        new_rows = new_rows[['user_id'] + NUMERIC_COLS + CATEGORICAL_COLS].reset_index(drop=True).fillna('')
+        model.scaler.partial_fit(new_rows[NUMERIC_COLS])
+        new_features = model._encode_features(new_rows)
+        new_items = model._encode_items(new_rows)
+
+        old = self.features
+        old = sparse.csr_matrix((old.data, old.indices, old.indptr), shape=(old.shape[0], new_features.shape[1]))
+        model.features = sparse.vstack([old, new_features], format='csr')
+        items = self.items
+        items = sparse.csr_matrix((items.data, items.indices, items.indptr), shape=(items.shape[0], new_items.shape[1]))
+        model.items = sparse.vstack([items, new_items], format='csr')
+
+        start = len(self.user_ids)
+        model.user_ids = np.concatenate([self.user_ids, new_rows['user_id'].to_numpy()])
+        model.row_of = dict(self.row_of)
+        for row, uid in enumerate(new_rows['user_id'].tolist(), start=start):
+            model.row_of.setdefault(uid, row)
+        if self.index is not None:
+            model.index = self.index.appended(model.features, start)
+        return model
+
+    def needs_refit(self):
+        """True once appends have doubled the rows the scaler and index were fitted on."""
+        return len(self.user_ids) > 2 * self.rows_at_fit
+
+def build_feature_model(df: pd.DataFrame, with_index=True):
+    """
+    Fit the lifestyle preprocessing once and keep the result as a HobbyFeatureModel.
+    """
+    df = df.reset_index(drop=True)
+    with span("encoder_fit"):
+        features, vocabularies, scaler = preprocess_lifestyle_data(df)
+    with span("normalize"):
+        features = l2_normalize(features)
+    return HobbyFeatureModel(df, features, vocabularies, scaler, with_index)
+
+def recommend_hobbies(df: pd.DataFrame, user_id, top_k=5, model: HobbyFeatureModel = None, n_probe=None):
+    """
+    Recommend new hobbies/clubs for a user based on similar users' preferences.
+    Pass a prebuilt HobbyFeatureModel to skip refitting the preprocessing per call.
+    """
+    if model is None:
+        model = build_feature_model(df, with_index=False)
 
     user_id = int(user_id)
-    if user_id not in sim_df.index:
+    row = model.row_of.get(user_id)
+    if row is None:
         return []
 
-    # Get similar users
-    similar_users = sim_df[user_id].sort_values(ascending=False).index[1:top_k+1]  # Exclude self
+    # Score only this user's row, via the approximate index on large datasets
+    top = neighbours_of(model, row, top_k, n_probe=n_probe)
+    with span("rank_items"):
+        return _rank_items(model, row, top, top_k)
 
-    # Collect hobbies/clubs from similar users
-    user_hobbies = set(df[df['user_id'] == user_id]['hobbies'].str.split(',').explode().str.strip())
-    user_clubs = set(df[df['user_id'] == user_id]['clubs'].str.split(',').explode().str.strip())
+def _rank_items(model: HobbyFeatureModel, row, top, top_k):
+    """Hobbies/clubs held by the neighbours in top that the user at row does not have yet."""
+    # Count every hobby/club held by the similar users with one sparse row sum
+    neighbour_items = model.items[top]
+    counts = np.asarray(neighbour_items.sum(axis=0)).ravel()
+    counts[model.items_of(row)] = 0
 
-    recommendations = {}
-    for sim_user in similar_users:
-        sim_hobbies = df[df['user_id'] == sim_user]['hobbies'].str.split(',').explode().str.strip()
-        sim_clubs = df[df['user_id'] == sim_user]['clubs'].str.split(',').explode().str.strip()
+    # Sort by frequency, ties going to whichever item the closest neighbours listed first
+    first_seen = np.full(len(counts), len(neighbour_items.indices), dtype=np.int64)
+    ids, positions = np.unique(neighbour_items.indices, return_index=True)
+    first_seen[ids] = positions
+    candidates = np.flatnonzero(counts)
+    ranked = candidates[np.lexsort((first_seen[candidates], -counts[candidates]))]
 
-        for hobby in sim_hobbies:
-            if hobby not in user_hobbies and hobby:
-                recommendations[hobby] = recommendations.get(hobby, 0) + 1
+    # A name used both as a hobby and as a club is only recommended once
+    names = pd.unique(model.item_names[ranked])
+    return list(names[:top_k])
 
-        for club in sim_clubs:
-            if club not in user_clubs and club:
-                recommendations[club] = recommendations.get(club, 0) + 1
+def _resolve_row(model: HobbyFeatureModel, user_id):
+    try:
+        return model.row_of.get(int(user_id))
+    except (TypeError, ValueError):
+        return None
 
-    # Sort by frequency and return top recommendations
-    sorted_recs = sorted(recommendations.items(), key=lambda x: x[1], reverse=True)
-    return [rec[0] for rec in sorted_recs[:top_k]]
+def recommend_hobbies_batch(model: HobbyFeatureModel, user_ids=None, top_k=5):
+    """
+    Yield {"user", "hobby_club_recommendations"} for each requested user (every user when None),
+    scoring the users in blocks of matrix products.
+    """
+    if user_ids is None:
+        user_ids = list(model.row_of)
+    rows = [_resolve_row(model, uid) for uid in user_ids]
+    results = neighbour_blocks(model, [row for row in rows if row is not None], top_k)
+    for uid, row in zip(user_ids, rows):
+        if row is None:
+            yield {"user": uid, "hobby_club_recommendations": []}
+            continue
+        _, top = next(results)
+        yield {"user": uid, "hobby_club_recommendations": _rank_items(model, row, top, top_k)}
@@ -0,0 +1,80 @@
+import pandas as pd
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+from schema import widened_dtype
+
+# Bytes read from the request body per iteration while streaming an upload to disk
+CHUNK_SIZE = 1024 * 1024
+
+# Column types for the schemas the recommenders understand; anything else is inferred
+KNOWN_DTYPES = {
+    'User': 'str',
+    'Friend': 'str',
+    'user_id': 'int64',
+    'favorite_cuisines': 'str',
+    'movie_genres': 'str',
+    'series_genres': 'str',
+    'gaming_platforms': 'str',
+    'music_genres': 'str',
+    'reading_genres': 'str',
+    'shopping_preferences': 'str',
+    'travel_destinations': 'str',
+    'hobbies': 'str',
+    'clubs': 'str',
+}
+
+async def save_upload(file: UploadFile, path: str):
+    """
+    Stream an uploaded file to path in CHUNK_SIZE pieces, so only one chunk is in memory.
+    Returns (bytes written, chunks written).
+    """
+    written = 0
+    chunks = 0
+    with open(path, "wb") as f:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            await run_in_threadpool(f.write, chunk)
+            written += len(chunk)
+            chunks += 1
+    return written, chunks
+
+def read_csv_fast(path: str):
+    """
+    Parse a CSV from disk with the multithreaded pyarrow engine and explicit dtypes for
+    known columns, falling back to the default parser for files pyarrow cannot handle
+    (e.g. quoted newlines in the header) or when pyarrow is not installed.
+    """
+    columns = pd.read_csv(path, nrows=0).columns
+    dtype = {c: KNOWN_DTYPES[c] for c in columns if c in KNOWN_DTYPES}
+    try:
+        return pd.read_csv(path, engine="pyarrow", dtype=dtype)
+    except Exception:
+        pass
+    try:
+        return pd.read_csv(path, dtype=dtype)
+    except (ValueError, TypeError):
+        # A known column name holding unexpected values; let pandas infer it instead
+        return pd.read_csv(path)
+
+def conform_to_schema(new_rows: pd.DataFrame, df: pd.DataFrame):
+    """
+    Reorder and cast new_rows to df's columns and dtypes, so they can be appended to it.
+    Compacted columns are cast to their wide type (int64, float64, the categories' type) so
+    no value is truncated; schema.concat_compact narrows them again after appending.
+    Raises ValueError naming the first column that does not fit.
+    """
+    missing = [c for c in df.columns if c not in new_rows.columns]
+    extra = [c for c in new_rows.columns if c not in df.columns]
+    if missing or extra:
+        raise ValueError(f"Columns do not match the current dataset (missing: {missing}, unexpected: {extra})")
+    new_rows = new_rows[list(df.columns)].copy()
+    for col in df.columns:
+        dtype = widened_dtype(df[col].dtype)
+        if new_rows[col].dtype != dtype:
+            try:
+                new_rows[col] = new_rows[col].astype(dtype)
+            except (ValueError, TypeError):
+                raise ValueError(f"Column {col!r} cannot be read as {df[col].dtype}")
+    return new_rows
@@ -0,0 +1,153 @@
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+# Per-process cache of the dataset and models a worker last loaded: (name, version) -> state
+_WORKER_STATE = {}
+
+class QueueFull(Exception):
+    pass
+
+def _attach_published(shared_root, name, version):
+    """The models the server published for this dataset version, or None if there are none."""
+    if shared_root is None:
+        return None
+    from shared_state import SharedState
+    shared = SharedState(shared_root)
+    pointer = shared.current()
+    if pointer is None or (pointer.get("name"), pointer.get("version")) != (name, version):
+        return None
+    meta, artefacts = shared.attach()
+    # A publish may have landed between reading the pointer and attaching
+    if meta is None or (meta.get("name"), meta.get("version")) != (name, version):
+        return None
+    return artefacts
+
+def _worker_dataset(store_root, name, version, shared_root=None):
+    """
+    Load (once per worker process and dataset version) the data and models a job needs.
+    Models come memory-mapped from the server's shared state when it has published this
+    version; they are only fitted here when nothing has been published.
+    """
+    key = (name, version)
+    state = _WORKER_STATE.get(key)
+    if state is None:
+        from dataset_store import DatasetStore
+        df = DatasetStore(store_root).load(name)
+        artefacts = _attach_published(shared_root, name, version)
+        if artefacts is not None:
+            state = {"df": df, "friend_model": artefacts["friend_model"],
+                     "hobby_model": artefacts["hobby_model"], "stats": artefacts.get("stats")}
+        else:
+            from recommender import build_recommender_model
+            from hobby_recommender import build_feature_model, is_lifestyle_data
+            state = {
+                "df": df,
+                "friend_model": build_recommender_model(df),
+                "hobby_model": build_feature_model(df) if is_lifestyle_data(df) else None,
+                "stats": None,
+            }
+        _WORKER_STATE.clear()
+        _WORKER_STATE[key] = state
+    return state
+
+def run_job(kind, params, store_root, name, version, shared_root=None):
+    """Entry point executed inside a worker process."""
+    state = _worker_dataset(store_root, name, version, shared_root)
+    df = state["df"]
+    if kind == "recommend":
+        from recommender import get_recommendations
+        user_id = params["user_id"]
+        recs = get_recommendations(df, user_id, top_k=params.get("top_k", 5), model=state["friend_model"])
+        return {"user": user_id, "recommendations": recs}
+    if kind == "recommend_hobbies":
+        from hobby_recommender import recommend_hobbies
+        if state["hobby_model"] is None:
+            raise ValueError("Loaded data has no lifestyle columns for hobby/club recommendations")
+        user_id = params["user_id"]
+        recs = recommend_hobbies(df, user_id, top_k=params.get("top_k", 5), model=state["hobby_model"])
+        return {"user": user_id, "hobby_club_recommendations": recs}
+    if kind == "visualize":
+        from visualization import create_visualizations
+        return {"chart_path": create_visualizations(df, version=f"{name}:{version}")}
+    if kind == "summary":
+        from dataset_store import DatasetStore
+        from dataset_stats import compute_stats, public_stats
+        stats = state["stats"] or DatasetStore(store_root).load_stats(name)
+        return public_stats(stats if stats is not None else compute_stats(df))
+    raise ValueError(f"Unknown job kind: {kind}")
+
+class JobManager:
+    """
+    Runs CPU-heavy analysis on a bounded process pool so the event loop stays free.
+    At most max_pending jobs may be queued or running; further submissions raise QueueFull.
+    """
+    def __init__(self, max_workers=2, max_pending=16, keep_finished=1000):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        if self._executor is None:
+            # Not fork: a worker forked while a request thread holds a lock (e.g. a metrics
+            # histogram's) inherits it locked and hangs on its first span()
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context(method))
+        return self._executor
+
+    def pending(self):
+        return sum(1 for job in self._jobs.values() if not job["future"].done())
+
+    def submit(self, kind, params, store_root, name, version, shared_root=None):
+        with self._lock:
+            if self.pending() >= self.max_pending:
+                raise QueueFull(f"{self.max_pending} jobs already queued or running")
+            job_id = uuid.uuid4().hex
+            future = self._pool().submit(run_job, kind, params, store_root, name, version, shared_root)
+            self._jobs[job_id] = {"id": job_id, "kind": kind, "params": params,
+                                  "dataset": name, "version": version,
+                                  "submitted_at": time.time(), "future": future}
+            self._prune()
+        return self.describe(job_id)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job["future"].done()]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
+
+    def describe(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        future = job["future"]
+        info = {k: v for k, v in job.items() if k != "future"}
+        if future.cancelled():
+            info["status"] = "cancelled"
+        elif not future.done():
+            info["status"] = "running" if future.running() else "queued"
+        elif future.exception() is not None:
+            info["status"] = "failed"
+            info["error"] = str(future.exception())
+        else:
+            info["status"] = "done"
+            info["result"] = future.result()
+        return info
+
+    def cancel(self, job_id):
+        """Cancel a queued job. Jobs already running in a worker cannot be interrupted."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        job["future"].cancel()
+        return self.describe(job_id)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,213 @@
+import json
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from scipy import sparse
+from similarity import similarity_row, top_k_blocked, top_k_indices
+from metrics import span
+
+# Total bytes of score buffers the workers may hold at once while building a table
+KNN_MEMORY_BYTES = 256 * 1024 * 1024
+# Columns scored per matrix product; each row's running top-k is merged after every one
+KNN_COLUMN_BLOCK = 8192
+# Rough bytes per cell of a block: float32 scores, merged scores and ids, argpartition output
+_BYTES_PER_CELL = 20
+
+class KnnTable:
+    """
+    Every row's k nearest neighbours by cosine similarity, as two N x k arrays:
+    ids holds neighbour row positions (best first, -1 where a row has fewer than k
+    neighbours) and scores the matching similarities as float32. A row never lists itself.
+    """
+    def __init__(self, ids, scores, version=None):
+        self.ids = ids
+        self.scores = scores
+        self.version = version
+
+    @property
+    def k(self):
+        return self.ids.shape[1]
+
+    def covers(self, top_k):
+        return top_k <= self.k
+
+    def neighbours(self, row, top_k):
+        """Positions of row's top_k neighbours, best first."""
+        ids = self.ids[row, :top_k]
+        return np.asarray(ids[ids >= 0], dtype=np.intp)
+
+    def save(self, path: str):
+        """Write ids.npy, scores.npy and meta.json under the directory path, replacing it atomically."""
+        tmp = path + ".tmp"
+        os.makedirs(tmp, exist_ok=True)
+        np.save(os.path.join(tmp, "ids.npy"), self.ids)
+        np.save(os.path.join(tmp, "scores.npy"), self.scores)
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({"rows": int(self.ids.shape[0]), "k": int(self.k), "version": self.version}, f)
+        if os.path.isdir(path):
+            old = path + ".old"
+            os.replace(path, old)
+            os.replace(tmp, path)
+            for name in os.listdir(old):
+                os.remove(os.path.join(old, name))
+            os.rmdir(old)
+        else:
+            os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, version=None):
+        """
+        Memory-map a saved table, or return None if there is none or it was built for a
+        different dataset version. Whether its k is still enough is up to the caller.
+        """
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+            if version is not None and meta["version"] != version:
+                return None
+            return cls(np.load(os.path.join(path, "ids.npy"), mmap_mode="r"),
+                       np.load(os.path.join(path, "scores.npy"), mmap_mode="r"), meta["version"])
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+
+def _block_top_k(normalized, rows, k, column_block, columns=None, best=None):
+    """
+    Top-k neighbours of rows among columns (every row when None), merging a running top-k
+    over column blocks. best, if given, is the (ids, scores) of rows the merge starts from.
+    """
+    n_columns = normalized.shape[0] if columns is None else len(columns)
+    block = normalized[rows]
+    if best is None:
+        best_ids = np.empty((len(rows), 0), dtype=np.int32)
+        best_scores = np.full((len(rows), 0), -np.inf, dtype=np.float32)
+    else:
+        best_ids, best_scores = best
+    for c0 in range(0, n_columns, column_block):
+        c1 = min(c0 + column_block, n_columns)
+        if columns is None:
+            column_ids = np.arange(c0, c1, dtype=np.int32)
+            scores = block @ normalized[c0:c1].T
+        else:
+            column_ids = columns[c0:c1].astype(np.int32)
+            scores = block @ normalized[column_ids].T
+        if sparse.issparse(scores):
+            scores = scores.toarray()
+        scores = np.asarray(scores, dtype=np.float32)
+        # Rows in both blocks must not be their own neighbour
+        _, own_rows, own_columns = np.intersect1d(rows, column_ids, assume_unique=True, return_indices=True)
+        scores[own_rows, own_columns] = -np.inf
+
+        scores = np.hstack([best_scores, scores])
+        ids = np.hstack([best_ids, np.broadcast_to(column_ids, (len(rows), c1 - c0))])
+        if scores.shape[1] > k:
+            keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, keep, axis=1)
+            ids = np.take_along_axis(ids, keep, axis=1)
+        best_scores, best_ids = scores, ids
+
+    # Best first, ties by position; slots that never found a neighbour become -1
+    order = np.lexsort((best_ids, -best_scores), axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    best_ids = np.take_along_axis(best_ids, order, axis=1)
+    best_ids[best_scores == -np.inf] = -1
+    return rows, best_ids, best_scores
+
+def _score_rows(ids, scores, normalized, rows, k, workers, memory_bytes, column_block, columns=None, merge=False):
+    """
+    Write the top-k of rows (among columns) into ids and scores, scoring row blocks on a
+    thread pool. With merge, each row's current entries are kept as a starting top-k.
+    """
+    block_rows = max(1, memory_bytes // (workers * _BYTES_PER_CELL * (column_block + k)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        blocks = []
+        for b in range(0, len(rows), block_rows):
+            part = rows[b:b + block_rows]
+            best = (ids[part], scores[part]) if merge else None
+            blocks.append(pool.submit(_block_top_k, normalized, part, k, column_block, columns, best))
+        for block in blocks:
+            part, block_ids, block_scores = block.result()
+            ids[part] = block_ids
+            scores[part] = block_scores
+
+def build_knn_table(normalized, k, workers=None, memory_bytes=KNN_MEMORY_BYTES,
+                    column_block=KNN_COLUMN_BLOCK, version=None):
+    """
+    All-pairs top-k over an L2-normalized matrix (dense or CSR) without the N x N matrix.
+
+    Rows are split into blocks that are scored on a thread pool (the matrix products
+    release the GIL). Each block walks the columns in column_block slices and keeps only a
+    running top-k per row, so the workers together hold about memory_bytes of scores.
+    Ties at the k-th score may keep either row.
+    """
+    n_rows = normalized.shape[0]
+    k = max(0, min(k, n_rows - 1))
+    workers = workers or os.cpu_count() or 1
+    column_block = max(1, min(column_block, n_rows))
+    ids = np.full((n_rows, k), -1, dtype=np.int32)
+    scores = np.full((n_rows, k), -np.inf, dtype=np.float32)
+    if k == 0:
+        return KnnTable(ids, scores, version)
+    if sparse.issparse(normalized):
+        normalized = normalized.tocsr()
+
+    with span("knn_build"):
+        _score_rows(ids, scores, normalized, np.arange(n_rows), k, workers, memory_bytes, column_block)
+    return KnnTable(ids, scores, version)
+
+def extend_knn_table(table, normalized, changed=(), workers=None, memory_bytes=KNN_MEMORY_BYTES,
+                     column_block=KNN_COLUMN_BLOCK, version=None):
+    """
+    table, built over the first rows of normalized, extended to all of them after an append.
+    Rows past the table are new; changed lists older rows whose vectors were updated.
+
+    New and changed rows, and rows whose list points at a changed row, are scored against
+    everything. Every other row only merges in its scores against the new and changed rows,
+    so the work grows with the rows appended rather than with the square of the dataset.
+    """
+    start, k = table.ids.shape
+    n_rows = normalized.shape[0]
+    workers = workers or os.cpu_count() or 1
+    column_block = max(1, min(column_block, n_rows))
+    ids = np.full((n_rows, k), -1, dtype=np.int32)
+    scores = np.full((n_rows, k), -np.inf, dtype=np.float32)
+    ids[:start] = table.ids
+    scores[:start] = table.scores
+    changed = np.unique(np.asarray(changed, dtype=np.int64))
+    if k == 0 or (start == n_rows and len(changed) == 0):
+        return KnnTable(ids, scores, version)
+    if sparse.issparse(normalized):
+        normalized = normalized.tocsr()
+
+    # A stale entry cannot just be dropped: the row's next-best neighbour was never kept
+    stale = np.isin(ids[:start], changed).any(axis=1)
+    stale[changed] = True
+    fresh = np.concatenate([changed, np.arange(start, n_rows)])
+    with span("knn_extend"):
+        _score_rows(ids, scores, normalized, np.flatnonzero(~stale), k, workers, memory_bytes, column_block,
+                    columns=fresh, merge=True)
+        _score_rows(ids, scores, normalized, np.concatenate([np.flatnonzero(stale), np.arange(start, n_rows)]),
+                    k, workers, memory_bytes, column_block)
+    return KnnTable(ids, scores, version)
+
+def neighbours_of(model, row, top_k, n_probe=None):
+    """
+    Positions of row's top_k neighbours, best first: read from the model's neighbour table
+    when it covers top_k, else found through the approximate index on large datasets, else
+    by scoring the row against every row. Shared by the friend and hobby recommenders.
+    """
+    if model.knn is not None and model.knn.covers(top_k):
+        return model.knn.neighbours(row, top_k)
+    if model.index is not None:
+        with span("ann_query"):
+            top, _ = model.index.query_row(row, top_k, n_probe=n_probe)
+        return top
+    with span("similarity"):
+        scores = similarity_row(model.features, row)
+    with span("sort"):
+        return top_k_indices(scores, top_k, exclude=row)
+
+def neighbour_blocks(model, rows, top_k):
+    """(row, positions) for each row, read from the model's neighbour table when it covers top_k."""
+    if model.knn is not None and model.knn.covers(top_k):
+        return ((row, model.knn.neighbours(row, top_k)) for row in rows)
+    return top_k_blocked(model.features, rows, top_k)
@@ -1,15 +1,91 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, status, Form
+import os, sys
+sys.path.insert(0, os.path.dirname(__file__))
+# First, so startup.STARTED marks the beginning of the import
+import startup
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, status, Form, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse, FileResponse
+from pydantic import BaseModel
+from typing import List, Literal, Optional, Union
 from fastapi.staticfiles import StaticFiles
-import pandas as pd, io, os, sys
-sys.path.insert(0, os.path.dirname(__file__))
-from recommender import get_recommendations
-from visualization import create_visualizations
-from hobby_recommender import recommend_hobbies
+from starlette.concurrency import run_in_threadpool
+import pandas as pd, json, time
+from visualization import create_visualizations, CHART_DIR
+from ingest import save_upload, read_csv_fast, conform_to_schema
+from schema import compact_dtypes, concat_compact
+from dataset_store import DatasetStore, dataset_name_for
+from dataset_stats import compute_stats, merge_stats
+from jobs import JobManager, QueueFull
+from shared_state import SharedState
+from preview import PREVIEW_MAX_LIMIT, encode_cursor, decode_cursor, parse_filter, select_page, arrow_ipc_stream
+from response_cache import ResponseCache
+from metrics import span, observe_request, start_request, server_timing, render_prometheus, REQUEST_SECONDS, REQUESTS
+import threading
+from contextlib import asynccontextmanager
+
+# The ML stacks (scikit-learn, scipy) and PDF rendering load on first use, so a worker that
+# only serves health checks, previews or charts never pays for them; see startup.py
+recommender = startup.lazy_module("recommender")
+graph_recommender = startup.lazy_module("graph_recommender")
+hobby_recommender = startup.lazy_module("hobby_recommender")
+ann = startup.lazy_module("ann")
+knn_table = startup.lazy_module("knn_table")
+reports = startup.lazy_module("reports")
+analyze = startup.lazy_module("analyze")
+# Preloaded on a background thread after startup when FRIENDLENS_WARMUP is set
+WARMUP_MODULES = ["recommender", "hobby_recommender", "graph_recommender", "knn_table", "analyze", "reports"]
+try:
+    import orjson
+except ImportError:
+    # Optional: responses fall back to the standard library encoder
+    orjson = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm restart: re-open the last active dataset from the columnar store
+    await run_in_threadpool(load_active_dataset)
+    global READY_SECONDS
+    READY_SECONDS = round(time.perf_counter() - startup.STARTED, 3)
+    if os.environ.get("FRIENDLENS_WARMUP", "") not in ("", "0"):
+        startup.warm_up(WARMUP_MODULES)
+    yield
+    JOBS.shutdown()
+
+app = FastAPI(title="FriendLens API", lifespan=lifespan)
 
-app = FastAPI(title="FriendLens API")
+# Seconds between checks for a generation another worker published
+SHARED_CHECK_INTERVAL = int(os.environ.get("FRIENDLENS_SHARED_CHECK_MS", 500)) / 1000
+_next_shared_check = 0.0
+
+@app.middleware("http")
+async def attach_shared_state(request: Request, call_next):
+    # Pick up a dataset another worker has published since our last check. Reading the
+    # pointer is file I/O, so it is done off the event loop and at most once per interval
+    global _next_shared_check
+    now = time.monotonic()
+    if request.url.path.startswith("/api/") and now >= _next_shared_check:
+        _next_shared_check = now + SHARED_CHECK_INTERVAL
+        if await run_in_threadpool(SHARED.changed):
+            await run_in_threadpool(sync_shared_state)
+    return await call_next(request)
+
+# Add a Server-Timing header listing every stage of the request
+SERVER_TIMING = os.environ.get("FRIENDLENS_SERVER_TIMING", "") not in ("", "0")
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    spans = start_request()
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    route = request.scope.get("route")
+    route = getattr(route, "path", None) or "unmatched"
+    REQUEST_SECONDS.observe(elapsed, request.method, route)
+    REQUESTS.inc(request.method, route, str(response.status_code))
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = server_timing(spans, elapsed)
+    return response
 
 app.add_middleware(
     CORSMiddleware,
@@ -31,7 +107,38 @@ USERS = {
 }
 
 DATA_DF = None
+# Seconds from process start until the app was ready to serve, set by lifespan
+READY_SECONDS = None
+# Derived artefacts, rebuilt only when DATA_DF changes
+HOBBY_MODEL = None
+FRIEND_MODEL = None
+GRAPH_MODEL = None
+# Precompute every user's 2-hop candidates for these graph methods when a dataset is loaded
+PRECOMPUTE_GRAPH_METHODS = [m for m in os.environ.get("FRIENDLENS_PRECOMPUTE_2HOP", "").split(",") if m]
+# Precompute every user's top-k neighbours when a dataset is loaded (0 leaves it to query time)
+KNN_TABLE_K = int(os.environ.get("FRIENDLENS_KNN_K", 0))
+KNN_MEMORY = int(os.environ.get("FRIENDLENS_KNN_MEMORY_MB", 0)) * 1024 * 1024 or None
+KNN_WORKERS = int(os.environ.get("FRIENDLENS_KNN_WORKERS", 0)) or None
 UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "uploads")
+STORE = DatasetStore(os.path.join(UPLOAD_DIR, "datasets"))
+DATASET_NAME = None
+DATASET_VERSION = None
+# Column statistics computed once at ingest and served by the summary endpoints
+DATASET_STATS = None
+# Published models that every uvicorn worker attaches to; see sync_shared_state
+SHARED = SharedState(os.path.join(UPLOAD_DIR, "shared"))
+_sync_lock = threading.Lock()
+# Held while a dataset is stored and installed, so an append never publishes on top of an
+# upload or activation that happened while it ran; reentrant because set_dataset takes it too
+_install_lock = threading.RLock()
+# Background analysis jobs, run on a bounded process pool
+JOBS = JobManager(max_workers=int(os.environ.get("FRIENDLENS_JOB_WORKERS", 2)),
+                  max_pending=int(os.environ.get("FRIENDLENS_JOB_QUEUE", 16)))
+# Recommendation results keyed on dataset version; FRIENDLENS_RESPONSE_CACHE_SIZE=0 disables it
+RESPONSES = ResponseCache(max_entries=int(os.environ.get("FRIENDLENS_RESPONSE_CACHE_SIZE", 1024)),
+                          ttl=float(os.environ.get("FRIENDLENS_RESPONSE_CACHE_TTL", 300)))
+# Most report-rendering processes one /api/reports request may start
+REPORT_WORKERS = int(os.environ.get("FRIENDLENS_REPORT_WORKERS", 0)) or os.cpu_count() or 1
 
 def authenticate(credentials: HTTPBasicCredentials = Depends(security)):
     username = credentials.username
@@ -44,163 +151,510 @@ def authenticate(credentials: HTTPBasicCredentials = Depends(security)):
         )
     return username
 
+def _install(df, name, version, stats, friend_model, hobby_model, graph_model):
+    # Swap everything in together so a concurrent request never mixes two datasets
+    global DATA_DF, HOBBY_MODEL, FRIEND_MODEL, GRAPH_MODEL, DATASET_NAME, DATASET_VERSION, DATASET_STATS
+    DATA_DF, DATASET_NAME, DATASET_VERSION, DATASET_STATS = df, name, version, stats
+    FRIEND_MODEL, HOBBY_MODEL, GRAPH_MODEL = friend_model, hobby_model, graph_model
+    RESPONSES.invalidate()
+
+def build_graph(df: pd.DataFrame):
+    """Friendship graph for edge-list data (None otherwise), with any configured 2-hop precompute."""
+    if not recommender.is_edge_list(df):
+        return None
+    model = graph_recommender.build_graph_model(df)
+    for method in PRECOMPUTE_GRAPH_METHODS:
+        graph_recommender.precompute_candidates(model, method)
+    return model
+
+def _short_table(table, n_rows):
+    """
+    True if table holds fewer neighbours than configured, because FRIENDLENS_KNN_K was raised
+    or a small dataset capped it. Such a table is rebuilt, or every top_k above its k would
+    quietly fall back to live scoring for good.
+    """
+    return table.k < min(KNN_TABLE_K, n_rows - 1)
+
+def _extendable_table(previous, model):
+    """previous's neighbour table if model is previous with rows appended and the table can grow with it."""
+    table = previous.knn if previous is not None else None
+    if table is None or table.ids.shape[0] != previous.features.shape[0]:
+        return None
+    if _short_table(table, model.features.shape[0]):
+        return None
+    return table
+
+def attach_knn_tables(name, version, models, previous=None):
+    """
+    Give each model its all-pairs neighbour table, reusing the one stored for this dataset
+    version if there is one and it holds the configured k. After an append, previous maps
+    a kind to the model the new one was appended to, and its table is extended with the new
+    rows instead of rebuilt; anything else is built from scratch. New tables are stored for
+    the next restart.
+    """
+    if not KNN_TABLE_K or name is None:
+        return
+    tag = f"{name}:{version}"
+    memory_bytes = KNN_MEMORY or knn_table.KNN_MEMORY_BYTES
+    for kind, model in models.items():
+        if model is None:
+            continue
+        path = STORE.knn_path_for(name, kind)
+        table = knn_table.KnnTable.load(path, version=tag)
+        if table is not None and _short_table(table, model.features.shape[0]):
+            table = None
+        if table is None:
+            base = _extendable_table((previous or {}).get(kind), model)
+            if base is not None:
+                table = knn_table.extend_knn_table(base, model.features, changed=model.updated_rows,
+                                                   workers=KNN_WORKERS, memory_bytes=memory_bytes, version=tag)
+            else:
+                table = knn_table.build_knn_table(model.features, KNN_TABLE_K, workers=KNN_WORKERS,
+                                                  memory_bytes=memory_bytes, version=tag)
+            table.save(path)
+        model.knn = table
+
+def set_dataset(df: pd.DataFrame, name: str = None, version: int = None, stats: dict = None):
+    """
+    Install df as the active dataset and rebuild everything derived from it.
+    Stored datasets are also published so the other workers pick up the same models.
+    """
+    with _install_lock:
+        if stats is None:
+            with span("stats"):
+                stats = compute_stats(df)
+        friend_model = recommender.build_recommender_model(df)
+        hobby_model = hobby_recommender.build_feature_model(df) if hobby_recommender.is_lifestyle_data(df) else None
+        graph_model = build_graph(df)
+        attach_knn_tables(name, version, {"friends": friend_model, "hobbies": hobby_model})
+        if name is not None:
+            with span("publish"):
+                SHARED.publish({"stats": stats, "friend_model": friend_model, "hobby_model": hobby_model,
+                                "graph_model": graph_model},
+                               name=name, version=version)
+        _install(df, name, version, stats, friend_model, hobby_model, graph_model)
+
+def save_dataset(df: pd.DataFrame, name: str, source: str, stats: dict):
+    """Store df under name and install it, in one step as far as appends are concerned."""
+    with _install_lock:
+        with span("store_write"):
+            entry = STORE.save(name, df, source, True, stats)
+        set_dataset(df, name, entry["version"], stats)
+        return entry
+
+def activate_stored(name: str):
+    """Make a stored dataset the active one and install it; raises KeyError for unknown names."""
+    with _install_lock:
+        entry = STORE.activate(name)
+        set_dataset(STORE.load(name), name, entry["version"], STORE.load_stats(name))
+        return entry
+
+class DatasetChanged(Exception):
+    pass
+
+def append_to_dataset(new_rows: pd.DataFrame, name: str):
+    """
+    Append rows to the active dataset, which must still be name, updating stats, storage
+    and models incrementally. Returns the dataset name with its updated registry entry.
+    The hobby model is refitted from scratch only once appends have doubled its size; the
+    graph and the neighbour tables are extended with the new rows rather than rebuilt.
+    """
+    with _install_lock:
+        if DATASET_NAME != name:
+            raise DatasetChanged(f"The active dataset changed to {DATASET_NAME!r} while appending to {name!r}")
+        df = DATA_DF
+        stats = merge_stats(DATASET_STATS, df, new_rows)
+        combined = concat_compact(df, new_rows)
+        # Store the new rows with the same compact types as the rows before them
+        new_rows = combined.iloc[len(df):].reset_index(drop=True)
+        stats["dtypes"] = {c: str(t) for c, t in combined.dtypes.items()}
+        entry = STORE.append(name, new_rows, stats)
+
+        # Models the new ones were appended to, whose neighbour tables can be extended
+        previous = {}
+        if FRIEND_MODEL is not None:
+            friend_model = FRIEND_MODEL.appended(new_rows)
+            previous["friends"] = FRIEND_MODEL
+        else:
+            friend_model = recommender.build_recommender_model(combined)
+        hobby_model = None
+        if HOBBY_MODEL is not None:
+            hobby_model = HOBBY_MODEL.appended(new_rows)
+            if hobby_model.needs_refit():
+                hobby_model = hobby_recommender.build_feature_model(combined)
+            else:
+                previous["hobbies"] = HOBBY_MODEL
+        graph_model = GRAPH_MODEL.appended(new_rows) if GRAPH_MODEL is not None else build_graph(combined)
+        attach_knn_tables(name, entry["version"], {"friends": friend_model, "hobbies": hobby_model}, previous)
+
+        SHARED.publish({"stats": stats, "friend_model": friend_model, "hobby_model": hobby_model,
+                        "graph_model": graph_model},
+                       name=name, version=entry["version"])
+        _install(combined, name, entry["version"], stats, friend_model, hobby_model, graph_model)
+        return {"dataset": name, **entry}
+
+def sync_shared_state():
+    """Attach to the latest models another worker published, if they are newer than ours."""
+    with _sync_lock:
+        if not SHARED.changed():
+            return False
+        meta, artefacts = SHARED.attach()
+        if meta is None or (meta["name"], meta["version"]) == (DATASET_NAME, DATASET_VERSION):
+            return False
+        df = STORE.load(meta["name"])
+        _install(df, meta["name"], meta["version"], artefacts["stats"],
+                 artefacts["friend_model"], artefacts["hobby_model"], artefacts.get("graph_model"))
+        return True
+
+def dataset_version():
+    """Identifier of the active dataset's content, or None if it was never stored."""
+    if DATASET_NAME is None:
+        return None
+    return f"{DATASET_NAME}:{DATASET_VERSION}"
+
+def load_active_dataset():
+    """Load the registry's active dataset, if there is one."""
+    name = STORE.active
+    if name is None:
+        return
+    current = SHARED.current()
+    if current is not None and current["name"] == name and current["version"] == STORE.get(name)["version"]:
+        # Another worker (or the previous run) already built the models; just attach
+        with startup.step("attach_shared_state"):
+            sync_shared_state()
+        return
+    try:
+        set_dataset(STORE.load(name), name, STORE.get(name)["version"], STORE.load_stats(name))
+    except (KeyError, OSError):
+        # Stale registry entry; start empty and wait for an upload
+        pass
+
 @app.post("/api/upload")
-async def upload_csv(file: UploadFile = File(...), user: str = Depends(authenticate)):
-    global DATA_DF
-    contents = await file.read()
+async def upload_csv(file: UploadFile = File(...), name: str = Form(None), user: str = Depends(authenticate)):
+    filename = os.path.basename(file.filename)
+    name = name or dataset_name_for(filename)
+    path = os.path.join(UPLOAD_DIR, filename)
+    # Stream to a temporary file first so a bad upload never replaces a good copy; the name
+    # is unique so concurrent uploads of the same file do not write into each other
+    partial_path = os.path.join(UPLOAD_DIR, f"upload-{os.getpid()}-{time.time_ns()}.part")
+    started = time.perf_counter()
+    with span("upload_receive"):
+        size, chunks = await save_upload(file, partial_path)
     try:
-        DATA_DF = pd.read_csv(io.BytesIO(contents))
+        with span("csv_parse"):
+            df = await run_in_threadpool(read_csv_fast, partial_path)
     except Exception as e:
+        os.remove(partial_path)
         raise HTTPException(status_code=400, detail=f"Could not read CSV: {e}")
-    # save a copy
-    path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(path, "wb") as f:
-        f.write(contents)
-    return {"filename": file.filename, "rows": DATA_DF.shape[0], "cols": DATA_DF.shape[1], "columns": list(DATA_DF.columns)}
+    os.replace(partial_path, path)
+    with span("compact_dtypes"):
+        df, memory = await run_in_threadpool(compact_dtypes, df)
+    with span("stats"):
+        stats = await run_in_threadpool(compute_stats, df)
+    try:
+        entry = await run_in_threadpool(save_dataset, df, name, filename, stats)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "filename": filename,
+        "dataset": name,
+        "version": entry["version"],
+        "rows": df.shape[0],
+        "cols": df.shape[1],
+        "columns": list(df.columns),
+        "bytes": size,
+        "chunks": chunks,
+        "memory": memory,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+@app.post("/api/append")
+async def append_csv(file: UploadFile = File(...), user: str = Depends(authenticate)):
+    """Add the rows of a CSV to the active dataset without rebuilding it."""
+    df, name = DATA_DF, DATASET_NAME
+    if df is None or name is None:
+        raise HTTPException(404, "No data loaded. Upload CSV first.")
+    partial_path = os.path.join(UPLOAD_DIR, f"append-{os.getpid()}-{time.time_ns()}.part")
+    started = time.perf_counter()
+    with span("upload_receive"):
+        size, chunks = await save_upload(file, partial_path)
+    try:
+        with span("csv_parse"):
+            new_rows = await run_in_threadpool(read_csv_fast, partial_path)
+        new_rows = conform_to_schema(new_rows, df)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not append CSV: {e}")
+    finally:
+        os.remove(partial_path)
+    try:
+        entry = await run_in_threadpool(append_to_dataset, new_rows, name)
+    except DatasetChanged as e:
+        raise HTTPException(409, str(e))
+    return {
+        "dataset": entry["dataset"],
+        "version": entry["version"],
+        "rows_appended": len(new_rows),
+        "rows": entry["rows"],
+        "bytes": size,
+        "chunks": chunks,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+@app.get("/api/datasets")
+def list_datasets(user: str = Depends(authenticate)):
+    return STORE.list()
+
+@app.post("/api/datasets/{name}/activate")
+async def activate_dataset(name: str, user: str = Depends(authenticate)):
+    try:
+        entry = await run_in_threadpool(activate_stored, name)
+    except KeyError:
+        raise HTTPException(404, f"No dataset named {name!r}")
+    return {"dataset": name, **entry}
 
 @app.get("/api/health")
 def health(user: str = Depends(authenticate)):
     return {"status": "authenticated"}
 
+@app.get("/api/startup")
+def startup_report(user: str = Depends(authenticate)):
+    """Time to ready, and when and at what cost each lazily imported module was loaded."""
+    return startup.report(READY_SECONDS)
+
+@app.get("/api/metrics")
+def metrics(user: str = Depends(authenticate)):
+    """Per-stage latency histograms and request counters in the Prometheus text format."""
+    return Response(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def json_response(content):
+    # Serialize inside the endpoint so the encoding time shows up as its own stage
+    with span("json_serialize"):
+        if orjson is None:
+            return JSONResponse(content)
+        return Response(orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS),
+                        media_type="application/json")
+
 @app.get("/api/preview")
-def preview(n: int = 10, user: str = Depends(authenticate)):
-    if DATA_DF is None:
+def preview(n: int = 10, cursor: str = None, columns: str = None, filter: Optional[List[str]] = Query(None),
+            format: Literal["json", "arrow"] = "json", user: str = Depends(authenticate)):
+    """
+    One page of the active dataset: n rows (at most PREVIEW_MAX_LIMIT) starting at cursor.
+    columns is a comma-separated projection and each filter is column:op:value
+    (op: eq, ne, lt, le, gt, ge, contains). Pass next_cursor back to get the following page.
+    format=arrow returns an Arrow IPC stream with the cursor in the X-Next-Cursor header.
+    """
+    df = DATA_DF
+    if df is None:
         raise HTTPException(404, "No data loaded. Upload CSV first.")
-    return {"head": DATA_DF.head(n).to_dict(orient="records")}
+    version = dataset_version()
+    limit = max(0, min(n, PREVIEW_MAX_LIMIT))
+    try:
+        position = decode_cursor(cursor, version) if cursor else 0
+        filters = [parse_filter(expr, df) for expr in filter or []]
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    projection = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+    unknown = [c for c in projection or [] if c not in df.columns]
+    if unknown:
+        raise HTTPException(400, f"Unknown columns: {unknown}")
+
+    observe_request("preview", rows=len(df))
+    with span("preview_select"):
+        page, next_position = select_page(df, position, limit, projection, filters)
+    next_cursor = encode_cursor(version, next_position) if next_position is not None else None
+    if format == "arrow":
+        with span("arrow_serialize"):
+            body = arrow_ipc_stream(page)
+        headers = {"X-Total-Rows": str(len(df))}
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        return Response(body, media_type="application/vnd.apache.arrow.stream", headers=headers)
+    return json_response({
+        "head": page.to_dict(orient="records"),
+        "columns": list(page.columns),
+        "total_rows": len(df),
+        "next_cursor": next_cursor,
+    })
 
 @app.get("/api/summary")
 def summary(user: str = Depends(authenticate)):
     if DATA_DF is None:
         raise HTTPException(404, "No data loaded. Upload CSV first.")
-    df = DATA_DF
+    stats = DATASET_STATS
     return {
-        "shape": df.shape,
-        "dtypes": {c: str(t) for c,t in df.dtypes.items()},
-        "missing": df.isnull().sum().to_dict(),
-        "unique_counts": df.nunique().to_dict()
+        "shape": stats["shape"],
+        "dtypes": stats["dtypes"],
+        "missing": stats["missing"],
+        "unique_counts": stats["unique_counts"],
+        "numeric": stats["numeric"],
+        "top_values": stats["top_values"],
     }
 
-@app.get("/api/recommend/{user_id}")
-def recommend(user_id: str, top_k: int = 5, user: str = Depends(authenticate)):
+class BatchRecommendRequest(BaseModel):
+    # Lifestyle ids are integers and edge-list ids strings; each model resolves either form
+    user_ids: Union[List[Union[int, str]], Literal["all"]] = "all"
+    kind: Literal["friends", "hobbies"] = "friends"
+    top_k: int = 5
+
+@app.post("/api/recommend/batch")
+def recommend_batch(req: BatchRecommendRequest, user: str = Depends(authenticate)):
+    """Recommendations for many users at once, streamed back as NDJSON while they are computed."""
     if DATA_DF is None:
         raise HTTPException(404, "No data loaded. Upload CSV first.")
-    recs = get_recommendations(DATA_DF, user_id, top_k=top_k)
-    return {"user": user_id, "recommendations": recs}
+    user_ids = None if req.user_ids == "all" else req.user_ids
+    if req.kind == "hobbies":
+        if HOBBY_MODEL is None:
+            raise HTTPException(400, "Loaded data has no lifestyle columns for hobby/club recommendations")
+        observe_request("recommend_batch", rows=len(DATA_DF), width=HOBBY_MODEL.features.shape[1])
+        results = hobby_recommender.recommend_hobbies_batch(HOBBY_MODEL, user_ids, top_k=req.top_k)
+    else:
+        if FRIEND_MODEL is None:
+            raise HTTPException(400, "Loaded data cannot be used for friend recommendations")
+        observe_request("recommend_batch", rows=len(DATA_DF), width=FRIEND_MODEL.features.shape[1])
+        results = recommender.batch_recommendations(FRIEND_MODEL, user_ids, top_k=req.top_k)
+    lines = (json.dumps(result) + "\n" for result in results)
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+@app.get("/api/recommend/{user_id}")
+def recommend(user_id: str, top_k: int = 5, n_probe: int = None,
+              mode: Literal["similarity", "common_neighbors", "adamic_adar", "ppr"] = "similarity",
+              user: str = Depends(authenticate)):
+    """
+    Friend suggestions for user_id. mode=similarity ranks by cosine similarity of friend lists;
+    the graph modes suggest friends-of-friends the user is not yet connected to.
+    """
+    df, friend_model, graph_model, version = DATA_DF, FRIEND_MODEL, GRAPH_MODEL, dataset_version()
+    if df is None:
+        raise HTTPException(404, "No data loaded. Upload CSV first.")
+    if mode != "similarity":
+        if graph_model is None:
+            raise HTTPException(400, "Graph recommendations need a User/Friend edge list")
+        observe_request("recommend", rows=len(df), width=len(graph_model.labels))
+        content = RESPONSES.get_or_compute("recommend", (version, user_id, top_k, mode), lambda: {
+            "user": user_id, "mode": mode,
+            "recommendations": graph_recommender.graph_recommendations(graph_model, user_id, top_k=top_k, method=mode),
+        })
+        return json_response(content)
+    observe_request("recommend", rows=len(df),
+                    width=friend_model.features.shape[1] if friend_model is not None else None)
+    content = RESPONSES.get_or_compute("recommend", (version, user_id, top_k, mode, n_probe), lambda: {
+        "user": user_id,
+        "recommendations": recommender.get_recommendations(df, user_id, top_k=top_k, model=friend_model, n_probe=n_probe),
+    })
+    return json_response(content)
 
 @app.get("/api/recommend_hobbies/{user_id}")
-def recommend_hobbies_endpoint(user_id: str, top_k: int = 5, user: str = Depends(authenticate)):
+def recommend_hobbies_endpoint(user_id: str, top_k: int = 5, n_probe: int = None, user: str = Depends(authenticate)):
+    df, hobby_model, version = DATA_DF, HOBBY_MODEL, dataset_version()
+    if df is None:
+        raise HTTPException(404, "No data loaded. Upload CSV first.")
+    observe_request("recommend_hobbies", rows=len(df),
+                    width=hobby_model.features.shape[1] if hobby_model is not None else None)
+    content = RESPONSES.get_or_compute("recommend_hobbies", (version, user_id, top_k, n_probe), lambda: {
+        "user": user_id,
+        "hobby_club_recommendations": hobby_recommender.recommend_hobbies(df, user_id, top_k=top_k,
+                                                                          model=hobby_model, n_probe=n_probe),
+    })
+    return json_response(content)
+
+@app.get("/api/ann/recall")
+def ann_recall(k: int = 10, n_probe: int = None, queries: int = 200, user: str = Depends(authenticate)):
+    """Recall@k of the approximate indexes against the exact path, for tuning n_probe."""
     if DATA_DF is None:
         raise HTTPException(404, "No data loaded. Upload CSV first.")
-    recs = recommend_hobbies(DATA_DF, user_id, top_k=top_k)
-    return {"user": user_id, "hobby_club_recommendations": recs}
+    report = {}
+    for name, model in (("friends", FRIEND_MODEL), ("hobbies", HOBBY_MODEL)):
+        if model is not None and model.index is not None:
+            report[name] = ann.recall_at_k(model.index, k=k, n_queries=queries, n_probe=n_probe)
+    if not report:
+        return {"message": "Dataset is small enough that recommendations use the exact path"}
+    return report
 
 @app.get("/api/visualize")
 def visualize(user: str = Depends(authenticate)):
     if DATA_DF is None:
         raise HTTPException(404, "No data loaded. Upload CSV first.")
-    path = create_visualizations(DATA_DF)
-    return {"chart_path": path}
+    observe_request("visualize", rows=len(DATA_DF))
+    path = create_visualizations(DATA_DF, version=dataset_version())
+    return {"chart_path": path, "chart_url": f"/api/charts/{os.path.basename(path)}" if path else None}
 
-@app.post("/api/analyze")
-async def analyze_data(task: str = Form(...), user: str = Depends(authenticate)):
+@app.get("/api/charts/{name}")
+def get_chart(name: str, request: Request, user: str = Depends(authenticate)):
+    """Serve a rendered chart. File names are content addressed, so the name doubles as the ETag."""
+    name = os.path.basename(name)
+    path = os.path.join(CHART_DIR, name)
+    if not name.endswith(".png") or not os.path.isfile(path):
+        raise HTTPException(404, "Chart not found")
+    etag = f'"{name}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="image/png", headers=headers)
+
+@app.get("/api/reports")
+def bulk_reports(top_k: int = 5, workers: int = Query(None, ge=1, le=REPORT_WORKERS),
+                 user: str = Depends(authenticate)):
+    """
+    A PDF profile report for every respondent, rendered on a process pool and streamed back
+    as a zip archive while it is being built. summary.json at the end of the archive holds
+    the throughput in reports per second.
+    """
     if DATA_DF is None:
         raise HTTPException(404, "No data loaded. Upload CSV first.")
+    if not reports.is_trait_data(DATA_DF):
+        raise HTTPException(400, "Loaded data has no trait columns for profile reports")
+    workers = workers or REPORT_WORKERS
+    filename = f"{DATASET_NAME or 'friendlens'}_reports.zip"
+    return StreamingResponse(reports.stream_reports_zip(DATA_DF, top_k=top_k, workers=workers),
+                             media_type="application/zip",
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
-    task_lower = task.lower().strip()
-
-    if "summary" in task_lower or "describe" in task_lower:
-        result = {
-            "task": task,
-            "result": {
-                "shape": DATA_DF.shape,
-                "columns": list(DATA_DF.columns),
-                "dtypes": {col: str(dtype) for col, dtype in DATA_DF.dtypes.items()},
-                "missing_values": DATA_DF.isnull().sum().to_dict(),
-                "unique_counts": DATA_DF.nunique().to_dict(),
-                "sample_data": DATA_DF.head(5).to_dict(orient="records")
-            }
-        }
-    elif "recommend" in task_lower and "friend" in task_lower:
-        # Extract user from task if mentioned
-        import re
-        user_match = re.search(r'for\s+(\w+)', task_lower)
-        target_user = user_match.group(1) if user_match else DATA_DF['User'].iloc[0] if 'User' in DATA_DF.columns else None
-
-        if target_user and 'User' in DATA_DF.columns and 'Friend' in DATA_DF.columns:
-            from recommender import get_recommendations
-            recs = get_recommendations(DATA_DF, target_user, top_k=5)
-            result = {
-                "task": task,
-                "result": {
-                    "user": target_user,
-                    "recommendations": recs
-                }
-            }
-        else:
-            result = {
-                "task": task,
-                "result": "Unable to find user or friendship data for recommendations"
-            }
-    elif "recommend" in task_lower and ("hobby" in task_lower or "hobbies" in task_lower or "club" in task_lower):
-        # Extract user from task if mentioned
-        import re
-        user_match = re.search(r'for\s+(\d+)', task_lower)
-        target_user = user_match.group(1) if user_match else DATA_DF['user_id'].iloc[0] if 'user_id' in DATA_DF.columns else None
-
-        if target_user and 'user_id' in DATA_DF.columns and 'hobbies' in DATA_DF.columns:
-            recs = recommend_hobbies(DATA_DF, target_user, top_k=5)
-            result = {
-                "task": task,
-                "result": {
-                    "user": target_user,
-                    "hobby_club_recommendations": recs
-                }
-            }
-        else:
-            result = {
-                "task": task,
-                "result": "Unable to find user or lifestyle data for hobby/club recommendations"
-            }
-    elif "visualize" in task_lower or "chart" in task_lower or "plot" in task_lower:
-        path = create_visualizations(DATA_DF)
-        result = {
-            "task": task,
-            "result": {
-                "chart_path": path,
-                "message": "Visualization created successfully"
-            }
-        }
-    elif "visualization" in task_lower:
-        path = create_visualizations(DATA_DF)
-        result = {
-            "task": task,
-            "result": {
-                "chart_path": path,
-                "message": "Visualization created successfully"
-            }
-        }
-    elif "count" in task_lower or "frequency" in task_lower:
-        if 'User' in DATA_DF.columns:
-            counts = DATA_DF['User'].value_counts().to_dict()
-            result = {
-                "task": task,
-                "result": {
-                    "user_counts": counts,
-                    "total_users": len(counts)
-                }
-            }
-        else:
-            result = {
-                "task": task,
-                "result": "No 'User' column found for counting"
-            }
-    else:
-        result = {
-            "task": task,
-            "result": f"I can help with: summary, friend recommendations, hobby/club recommendations, visualizations, or user counts. Please specify one of these tasks."
-        }
+class JobRequest(BaseModel):
+    kind: Literal["recommend", "recommend_hobbies", "visualize", "summary"]
+    params: dict = {}
 
-    return result
+@app.post("/api/jobs", status_code=202)
+def submit_job(req: JobRequest, user: str = Depends(authenticate)):
+    """Queue an analysis job on the worker pool; poll GET /api/jobs/{id} for the result."""
+    if DATA_DF is None or DATASET_NAME is None:
+        raise HTTPException(404, "No data loaded. Upload CSV first.")
+    if req.kind in ("recommend", "recommend_hobbies") and "user_id" not in req.params:
+        raise HTTPException(400, "params.user_id is required")
+    try:
+        return JOBS.submit(req.kind, req.params, STORE.root, DATASET_NAME, DATASET_VERSION, SHARED.root)
+    except QueueFull as e:
+        raise HTTPException(429, str(e))
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str, user: str = Depends(authenticate)):
+    job = JOBS.describe(job_id)
+    if job is None:
+        raise HTTPException(404, "No such job")
+    return job
+
+@app.delete("/api/jobs/{job_id}")
+def cancel_job(job_id: str, user: str = Depends(authenticate)):
+    job = JOBS.cancel(job_id)
+    if job is None:
+        raise HTTPException(404, "No such job")
+    if job["status"] != "cancelled":
+        raise HTTPException(409, f"Job is {job['status']} and can no longer be cancelled")
+    return job
+
+@app.post("/api/analyze")
+def analyze_data(task: List[str] = Form(...), user: str = Depends(authenticate)):
+    """
+    Run one or more free-text tasks (repeat the task field) against one snapshot of the data.
+    Work shared between tasks is done once and independent tasks run concurrently. A single
+    task returns {"task", "result"} as before; several return {"dataset", "results"} in order.
+    """
+    if DATA_DF is None:
+        raise HTTPException(404, "No data loaded. Upload CSV first.")
+    snapshot = analyze.Snapshot(DATA_DF, DATASET_STATS, FRIEND_MODEL, HOBBY_MODEL, dataset_version(), RESPONSES)
+    results = analyze.run_tasks(snapshot, task)
+    if len(results) == 1:
+        return json_response(results[0])
+    return json_response({"dataset": snapshot.version, "results": results})
 
 # Mount static files for the frontend
 app.mount("/", StaticFiles(directory=os.path.join(os.path.dirname(__file__), "../../frontend/dist"), html=True), name="static")
@@ -0,0 +1,125 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Upper bounds of the dataset rows / feature width histograms
+SIZE_BUCKETS = (10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# Stages timed during the current request, for the Server-Timing header; None outside a request
+_request_spans = contextvars.ContextVar("request_spans", default=None)
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, in the shape Prometheus expects."""
+    def __init__(self, name, description, labels, buckets):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for label_values, series in sorted(self.series.items()):
+                labels = [f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values)]
+                joined = ",".join(labels)
+                total = 0
+                for bound, count in zip(list(self.buckets) + ["+Inf"], series["counts"]):
+                    total += count
+                    bucket_labels = ",".join(labels + [f'le="{bound}"'])
+                    lines.append(f"{self.name}_bucket{{{bucket_labels}}} {total}")
+                lines.append(f"{self.name}_sum{{{joined}}} {series['sum']:.6f}")
+                lines.append(f"{self.name}_count{{{joined}}} {total}")
+        return lines
+
+class Counter:
+    def __init__(self, name, description, labels):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for label_values, value in sorted(self.values.items()):
+                labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+                lines.append(f"{self.name}{{{labels}}} {value}")
+        return lines
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+STAGE_SECONDS = Histogram("friendlens_stage_seconds", "Time spent in each processing stage.",
+                          ("stage",), LATENCY_BUCKETS)
+REQUEST_SECONDS = Histogram("friendlens_request_seconds", "HTTP request latency by route.",
+                            ("method", "route"), LATENCY_BUCKETS)
+REQUESTS = Counter("friendlens_requests_total", "HTTP requests by route and status code.",
+                   ("method", "route", "status"))
+DATASET_ROWS = Histogram("friendlens_request_dataset_rows", "Rows in the dataset a request was served from.",
+                         ("endpoint",), SIZE_BUCKETS)
+FEATURE_WIDTH = Histogram("friendlens_request_feature_width", "Width of the feature matrix a request scored against.",
+                          ("endpoint",), SIZE_BUCKETS)
+CACHE_LOOKUPS = Counter("friendlens_response_cache_total", "Response cache lookups by endpoint and outcome.",
+                        ("endpoint", "result"))
+METRICS = [STAGE_SECONDS, REQUEST_SECONDS, REQUESTS, DATASET_ROWS, FEATURE_WIDTH, CACHE_LOOKUPS]
+
+@contextmanager
+def span(stage):
+    """Time the enclosed block as one stage; also listed in Server-Timing when enabled."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+def observe_request(endpoint, rows=None, width=None):
+    """Record the size of the data a request worked on."""
+    if rows is not None:
+        DATASET_ROWS.observe(rows, endpoint)
+    if width is not None:
+        FEATURE_WIDTH.observe(width, endpoint)
+
+def start_request():
+    """Begin collecting this request's spans; returns the list they are appended to."""
+    spans = []
+    _request_spans.set(spans)
+    return spans
+
+def server_timing(spans, total=None):
+    """Server-Timing header value: one entry per stage (repeats summed), durations in ms."""
+    totals = {}
+    for stage, elapsed in spans:
+        totals[stage] = totals.get(stage, 0.0) + elapsed
+    entries = [f"{stage};dur={elapsed * 1000:.2f}" for stage, elapsed in totals.items()]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+def render_prometheus():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+# Columns with at most this many distinct values are binned per value instead of sampled
+MAX_DISCRETE_LEVELS = 50
+# Upper bound on the points a sampled scatter sends to the browser
+MAX_SCATTER_POINTS = 5_000
+
+def is_discrete(series: pd.Series, max_levels=MAX_DISCRETE_LEVELS):
+    """True for integer, boolean, categorical or text columns with few distinct values (e.g. 1-5 Likert scores)."""
+    if pd.api.types.is_float_dtype(series):
+        return False
+    return series.nunique(dropna=True) <= max_levels
+
+def aggregate_counts(df: pd.DataFrame, columns):
+    """
+    Rows per distinct combination of columns, as a frame of those columns plus a count column.
+    Each column is factorized once and the combinations are counted with one bincount, so the
+    cost is O(rows) and the result has at most one row per occupied cell. Rows with a missing
+    value in any of the columns are left out.
+    """
+    codes, uniques = [], []
+    for col in columns:
+        c, u = pd.factorize(df[col], sort=True)
+        codes.append(c)
+        uniques.append(np.asarray(u))
+    shape = tuple(max(len(u), 1) for u in uniques)
+    valid = np.logical_and.reduce([c >= 0 for c in codes])
+    flat = np.ravel_multi_index([c[valid] for c in codes], shape)
+    counts = np.bincount(flat, minlength=int(np.prod(shape)))
+    cells = np.flatnonzero(counts)
+    positions = np.unravel_index(cells, shape)
+    out = pd.DataFrame({col: u[p] for col, u, p in zip(columns, uniques, positions)})
+    out["count"] = counts[cells]
+    return out
+
+def downsample(df: pd.DataFrame, max_points=MAX_SCATTER_POINTS, seed=0):
+    """At most max_points rows of df, the same rows on every call, in their original order."""
+    if len(df) <= max_points:
+        return df
+    return df.sample(n=max_points, random_state=seed).sort_index()
+
+def scatter_data(df: pd.DataFrame, x, y, color=None, max_points=MAX_SCATTER_POINTS):
+    """
+    What a scatter of x against y (coloured by color) should draw, with a payload bounded
+    regardless of the number of rows. Returns (frame, mode):
+    "aggregated" when every column is discrete, one row per occupied cell with its count;
+    "sampled" otherwise, a deterministic sample of at most max_points rows.
+    """
+    columns = [c for c in (x, y, color) if c is not None]
+    if all(is_discrete(df[c]) for c in columns):
+        return aggregate_counts(df, columns), "aggregated"
+    return downsample(df[columns], max_points), "sampled"
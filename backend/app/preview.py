@@ -0,0 +1,100 @@
+import base64
+import json
+import operator
+import pandas as pd
+
+# Largest page a single preview request may return
+PREVIEW_MAX_LIMIT = 10_000
+# Rows examined per step while looking for filter matches
+SCAN_CHUNK = 65_536
+
+FILTER_OPS = {
+    'eq': operator.eq,
+    'ne': operator.ne,
+    'lt': operator.lt,
+    'le': operator.le,
+    'gt': operator.gt,
+    'ge': operator.ge,
+}
+
+def encode_cursor(version, position: int):
+    """Opaque cursor for the row after the last one returned, tied to the dataset version."""
+    payload = json.dumps({"v": version, "p": position}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cursor(cursor: str, version):
+    """Row position a cursor points at. Raises ValueError if it is malformed or for another dataset."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        position = int(payload["p"])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Malformed cursor")
+    if payload.get("v") != version:
+        raise ValueError("The dataset changed since this cursor was issued; start again without a cursor")
+    return position
+
+def parse_filter(expr: str, df: pd.DataFrame):
+    """
+    Parse a "column:op:value" filter, op being one of eq, ne, lt, le, gt, ge or contains.
+    The value is read as a number for numeric columns. Raises ValueError on bad input.
+    """
+    parts = expr.split(":", 2)
+    if len(parts) != 3:
+        raise ValueError(f"Filter {expr!r} is not of the form column:op:value")
+    column, op, value = parts
+    if column not in df.columns:
+        raise ValueError(f"Unknown column {column!r} in filter")
+    if op != 'contains' and op not in FILTER_OPS:
+        raise ValueError(f"Unknown filter op {op!r}; expected contains or one of {list(FILTER_OPS)}")
+    if op != 'contains' and pd.api.types.is_numeric_dtype(df[column]):
+        try:
+            value = float(value)
+        except ValueError:
+            raise ValueError(f"Column {column!r} is numeric but filter value {value!r} is not")
+    return column, op, value
+
+def _mask(chunk: pd.DataFrame, filters):
+    mask = pd.Series(True, index=chunk.index)
+    for column, op, value in filters:
+        series = chunk[column]
+        if op == 'contains':
+            mask &= series.astype(str).str.contains(value, regex=False, na=False)
+        elif isinstance(value, str):
+            mask &= FILTER_OPS[op](series.astype(str), value)
+        else:
+            mask &= FILTER_OPS[op](series, value)
+    return mask.to_numpy()
+
+def select_page(df: pd.DataFrame, position=0, limit=100, columns=None, filters=()):
+    """
+    Up to limit rows from position onwards that match every filter, projected to columns.
+    Returns (page, next position or None at the end). Only the rows up to the last match
+    are scanned, in SCAN_CHUNK steps, so later pages of a large dataset stay cheap.
+    """
+    if not filters:
+        end = min(position + limit, len(df))
+        page = df.iloc[position:end]
+        return (page[columns] if columns else page), (end if end < len(df) else None)
+
+    pieces = []
+    found = 0
+    scan = position
+    while scan < len(df) and found < limit:
+        chunk = df.iloc[scan:scan + SCAN_CHUNK]
+        hits = _mask(chunk, filters).nonzero()[0][:limit - found]
+        if len(hits):
+            pieces.append(chunk.iloc[hits])
+            found += len(hits)
+        # Resume right after the last returned row once the page is full
+        scan = scan + int(hits[-1]) + 1 if found == limit else scan + len(chunk)
+    page = pd.concat(pieces) if pieces else df.iloc[0:0]
+    return (page[columns] if columns else page), (scan if scan < len(df) else None)
+
+def arrow_ipc_stream(page: pd.DataFrame):
+    """Serialize a page as an Arrow IPC stream, for clients that decode columns directly."""
+    import pyarrow as pa
+    table = pa.Table.from_pandas(page, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
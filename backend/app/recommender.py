@@ -1,33 +1,161 @@
+import copy
+import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
-
-def get_recommendations(df: pd.DataFrame, user_id, top_k=5):
-    # If dataset has 'User' and 'Friend' columns (edge list), build user-friend matrix
-    if 'User' in df.columns and 'Friend' in df.columns:
-        pivot = pd.crosstab(df['User'].astype(str), df['Friend'].astype(str))
-    else:
-        # fallback: use first column as user id and numeric attributes for similarity
-        idx_col = df.columns[0]
+from scipy import sparse
+from similarity import l2_normalize
+from ann import build_ann_index
+from knn_table import neighbour_blocks, neighbours_of
+from metrics import span
+
+class RecommenderModel:
+    """
+    Row labels plus an L2-normalized feature matrix (dense or CSR) for friend recommendations.
+    Built once per dataset; get_recommendations only scores the target row against it,
+    through the approximate index when the dataset is large enough to have one.
+    """
+    # Precomputed all-pairs neighbour table (see knn_table), attached after the model is built
+    knn = None
+    # Rows from before the last append whose vectors it changed, so the table can be extended
+    updated_rows = ()
+
+    def __init__(self, labels: pd.Index, features, with_index=True):
+        self.labels = labels
+        self.features = features
+        self.index = build_ann_index(features) if with_index else None
+        # Edge-list models keep the raw User x Friend counts so appends can add edges
+        self.adjacency = None
+        self.columns = None
+        # Attribute models remember which columns they were built from
+        self.key_column = None
+        self.attribute_columns = None
+
+    def appended(self, new_rows: pd.DataFrame):
+        """
+        A copy of this model with new_rows added. Edge lists add the new edges to the adjacency
+        (new ids get new rows/columns at the end); attribute data appends the new rows' vectors.
+        Nothing is re-encoded for the rows already in the model.
+        """
+        model = copy.copy(self)
+        model.knn = None
+        start = len(self.labels)
+        if self.adjacency is not None:
+            users = new_rows['User'].astype(str)
+            friends = new_rows['Friend'].astype(str)
+            model.labels = self.labels.append(pd.Index(users.unique()).difference(self.labels, sort=False))
+            model.columns = self.columns.append(pd.Index(friends.unique()).difference(self.columns, sort=False))
+            shape = (len(model.labels), len(model.columns))
+            old = self.adjacency
+            old = sparse.csr_matrix((old.data, old.indices, old.indptr), shape=(old.shape[0], shape[1]))
+            old = sparse.vstack([old, sparse.csr_matrix((shape[0] - start, shape[1]), dtype=np.float32)], format='csr')
+            delta = sparse.csr_matrix((np.ones(len(users), dtype=np.float32),
+                                       (model.labels.get_indexer(users), model.columns.get_indexer(friends))),
+                                      shape=shape)
+            model.adjacency = old + delta
+            model.features = l2_normalize(model.adjacency)
+            existing = model.labels.get_indexer(users)
+            model.updated_rows = np.unique(existing[existing < start])
+        else:
+            pivot = new_rows.set_index(self.key_column)[self.attribute_columns].fillna(0)
+            model.labels = self.labels.append(pivot.index)
+            model.features = np.vstack([self.features, l2_normalize(pivot.to_numpy(dtype=np.float32))])
+            model.updated_rows = ()
+        if self.index is not None:
+            model.index = self.index.appended(model.features, start)
+        return model
+
+def is_edge_list(df: pd.DataFrame):
+    return 'User' in df.columns and 'Friend' in df.columns
+
+def build_edge_model(df: pd.DataFrame, with_index=True):
+    """
+    Sparse User x Friend adjacency built straight from the edge list.
+    Ids are integer-encoded in sorted order, matching the rows and columns pd.crosstab produced.
+    """
+    with span("encode"):
+        user_codes, users = pd.factorize(df['User'].astype(str), sort=True)
+        friend_codes, friends = pd.factorize(df['Friend'].astype(str), sort=True)
+        counts = np.ones(len(user_codes), dtype=np.float32)
+        adjacency = sparse.csr_matrix((counts, (user_codes, friend_codes)),
+                                      shape=(len(users), len(friends)))
+        adjacency.sum_duplicates()
+    with span("normalize"):
+        normalized = l2_normalize(adjacency)
+    model = RecommenderModel(pd.Index(users), normalized, with_index)
+    model.adjacency = adjacency
+    model.columns = pd.Index(friends)
+    return model
+
+def build_attribute_model(df: pd.DataFrame, with_index=True):
+    """Dense model over the numeric attributes, keyed by the first column."""
+    # fallback: use first column as user id and numeric attributes for similarity
+    idx_col = df.columns[0]
+    with span("encode"):
         pivot = df.set_index(idx_col).select_dtypes(include=['number']).fillna(0)
+    with span("normalize"):
+        normalized = l2_normalize(pivot.to_numpy(dtype=np.float32))
+    model = RecommenderModel(pivot.index, normalized, with_index)
+    model.key_column = idx_col
+    model.attribute_columns = list(pivot.columns)
+    return model
 
+def build_recommender_model(df: pd.DataFrame, with_index=True):
+    """Build the model matching the dataset's shape, or None if it cannot be scored."""
     try:
-        sim = cosine_similarity(pivot)
-        sim_df = pd.DataFrame(sim, index=pivot.index, columns=pivot.index)
+        if is_edge_list(df):
+            return build_edge_model(df, with_index)
+        return build_attribute_model(df, with_index)
     except Exception as e:
-        return []
+        return None
 
+def _row_position(index: pd.Index, label):
+    """Position of the first row carrying label, or None if it is absent."""
+    if label not in index:
+        return None
+    loc = index.get_loc(label)
+    if isinstance(loc, slice):
+        return loc.start
+    if isinstance(loc, np.ndarray):
+        return int(np.flatnonzero(loc)[0])
+    return int(loc)
+
+def resolve_row(model: RecommenderModel, user_id):
+    """Row of user_id in the model, falling back to reading it as a row number."""
     user_id = str(user_id)
-    if user_id not in sim_df.index:
+    row = _row_position(model.labels, user_id)
+    if row is None:
         # try interpret as integer index
-        if user_id.isdigit():
-            idx = int(user_id)
-            if idx < len(sim_df):
-                user_id = sim_df.index[idx]
-            else:
-                return []
-        else:
-            return []
+        if user_id.isdigit() and int(user_id) < len(model.labels):
+            row = int(user_id)
+    return row
+
+def get_recommendations(df: pd.DataFrame, user_id, top_k=5, model: RecommenderModel = None, n_probe=None):
+    # Reuse a prebuilt model when the caller has one; otherwise build it for this call
+    # (a one-off query is cheaper brute force than fitting an index for it)
+    if model is None:
+        model = build_recommender_model(df, with_index=False)
+    if model is None:
+        return []
+
+    row = resolve_row(model, user_id)
+    if row is None:
+        return []
+
+    top = neighbours_of(model, row, top_k, n_probe=n_probe)
+    return model.labels[top].tolist()
 
-    scores = sim_df[user_id].sort_values(ascending=False)
-    scores = scores[scores.index != user_id]
-    return scores.head(top_k).index.tolist()
+def batch_recommendations(model: RecommenderModel, user_ids=None, top_k=5):
+    """
+    Yield {"user", "recommendations"} for each requested user (every user when None).
+    Users are scored in blocks of matrix products rather than one request at a time.
+    """
+    if user_ids is None:
+        user_ids = model.labels.tolist()
+    rows = [resolve_row(model, uid) for uid in user_ids]
+    known = [row for row in rows if row is not None]
+    results = neighbour_blocks(model, known, top_k)
+    for uid, row in zip(user_ids, rows):
+        if row is None:
+            yield {"user": uid, "recommendations": []}
+            continue
+        _, top = next(results)
+        yield {"user": uid, "recommendations": model.labels[top].tolist()}
@@ -0,0 +1,167 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from fpdf import FPDF
+from similarity import l2_normalize, top_k_blocked
+
+# Trait schema of friendlens_data.csv: Likert scores used for matching, then preferences
+TRAIT_COLS = ['Spice_Tolerance', 'Sweet_Tooth_Level', 'Ethical_Shopping', 'Travel_Planning_Pref',
+              'Introversion_Extraversion', 'Risk_Taking', 'Conscientiousness', 'Open_to_New_Exp',
+              'Teamwork_Preference']
+PREFERENCE_COLS = ['Diet', 'Tea_vs_Coffee', 'Hobby_Top1', 'Club_Top1']
+LABELS = {
+    'Introversion_Extraversion': 'Introversion-Extraversion',
+    'Hobby_Top1': 'Top Hobby',
+    'Club_Top1': 'Top Club',
+    'Tea_vs_Coffee': 'Tea vs Coffee',
+}
+
+# Reports handed to a worker per task, and tasks in flight per worker. Bounds how many
+# rendered PDFs exist at once, however large the dataset.
+CHUNK_SIZE = 64
+IN_FLIGHT_PER_WORKER = 2
+
+def is_trait_data(df: pd.DataFrame):
+    """True if the dataset has every trait column the profile reports are built from."""
+    return all(c in df.columns for c in TRAIT_COLS)
+
+def _latin1(value):
+    # The core FPDF fonts only cover latin-1
+    return str(value).encode('latin-1', 'replace').decode('latin-1')
+
+def render_report(profile: dict, matches=(), title="FriendLens Profile Report"):
+    """
+    One profile report as PDF bytes. matches is a list of (description, similarity) pairs
+    for the most similar respondents, best first.
+    """
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    pdf.cell(200, 10, txt=_latin1(title), ln=True, align='C')
+    for col in TRAIT_COLS + PREFERENCE_COLS:
+        if col in profile:
+            label = LABELS.get(col, col.replace('_', ' '))
+            pdf.cell(200, 10, txt=_latin1(f"{label}: {profile[col]}"), ln=True)
+    if len(matches):
+        pdf.ln(5)
+        pdf.cell(200, 10, txt="Top Matches", ln=True)
+        for i, (description, similarity) in enumerate(matches, start=1):
+            pdf.cell(200, 10, txt=_latin1(f"#{i} {description} (similarity {similarity:.2f})"), ln=True)
+    return pdf.output(dest='S').encode('latin-1')
+
+def describe_match(df: pd.DataFrame, row: int):
+    parts = [str(df.iat[row, df.columns.get_loc(col)]) for col in PREFERENCE_COLS if col in df.columns]
+    return f"Respondent {row + 1}" + (f" - {', '.join(parts)}" if parts else "")
+
+def _report_tasks(df: pd.DataFrame, top_k):
+    """Yield chunks of (file name, title, profile, matches), finding every row's matches in blocks."""
+    features = df[TRAIT_COLS].to_numpy(dtype=np.float32)
+    normalized = l2_normalize(features)
+    columns = [c for c in TRAIT_COLS + PREFERENCE_COLS if c in df.columns]
+    records = df[columns].to_dict(orient="records")
+    chunk = []
+    for row, top in top_k_blocked(normalized, range(len(df)), top_k):
+        scores = normalized[top] @ normalized[row]
+        matches = [(describe_match(df, int(m)), float(s)) for m, s in zip(top, scores)]
+        title = f"FriendLens Profile Report - Respondent {row + 1}"
+        chunk.append((f"report_{row + 1:06d}.pdf", title, records[row], matches))
+        if len(chunk) == CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _render_chunk(chunk):
+    """Worker entry point: render one chunk of reports."""
+    return [(name, render_report(profile, matches, title=title)) for name, title, profile, matches in chunk]
+
+def iter_reports(df: pd.DataFrame, top_k=5, workers=None):
+    """
+    Yield (file name, PDF bytes) for every row of df, in row order, rendered across a
+    process pool. Only a bounded number of chunks are queued or finished at any time.
+    """
+    workers = workers or os.cpu_count() or 1
+    pending = deque()
+    # Not fork: this runs inside a threaded server, and a forked worker would inherit any
+    # lock another thread held at that moment, locked for good
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method)) as pool:
+        for chunk in _report_tasks(df, top_k):
+            pending.append(pool.submit(_render_chunk, chunk))
+            if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+class _ZipSink:
+    """Write-only file object that hands over whatever zipfile has written since the last take()."""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def stream_reports_zip(df: pd.DataFrame, top_k=5, workers=None, summary: dict = None):
+    """
+    Yield a zip archive of every row's report as byte chunks, one chunk per report, so the
+    archive can be streamed to a client or file without holding it in memory. The archive
+    ends with summary.json (report count, seconds, reports per second), which is also
+    copied into summary when given.
+    """
+    start = time.perf_counter()
+    sink = _ZipSink()
+    count = 0
+    # PDF pages are already deflated, so the archive just stores them
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+        for name, pdf in iter_reports(df, top_k=top_k, workers=workers):
+            archive.writestr(name, pdf)
+            count += 1
+            yield sink.take()
+        seconds = time.perf_counter() - start
+        result = {
+            "reports": count,
+            "seconds": round(seconds, 3),
+            "reports_per_sec": round(count / seconds, 1) if seconds else None,
+            "workers": workers or os.cpu_count() or 1,
+        }
+        archive.writestr("summary.json", json.dumps(result, indent=2))
+    if summary is not None:
+        summary.update(result)
+    yield sink.take()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a PDF profile report for every respondent into a zip archive.")
+    parser.add_argument("csv", help="trait dataset, e.g. friendlens_data.csv")
+    parser.add_argument("-o", "--output", default="friendlens_reports.zip")
+    parser.add_argument("-k", "--top-k", type=int, default=5, help="matches listed per report")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    df = pd.read_csv(args.csv)
+    if not is_trait_data(df):
+        parser.error(f"{args.csv} is missing trait columns: {[c for c in TRAIT_COLS if c not in df.columns]}")
+    summary = {}
+    with open(args.output, "wb") as f:
+        for chunk in stream_reports_zip(df, top_k=args.top_k, workers=args.workers, summary=summary):
+            f.write(chunk)
+    print(f"Wrote {summary['reports']} reports to {args.output} in {summary['seconds']}s "
+          f"({summary['reports_per_sec']} reports/sec, {summary['workers']} workers)")
+
+if __name__ == "__main__":
+    main()
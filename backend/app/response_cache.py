@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from metrics import CACHE_LOOKUPS
+
+class ResponseCache:
+    """
+    LRU cache of endpoint results with a TTL, plus single-flight coalescing of misses.
+
+    Keys start with the dataset version, so results from an older dataset are never served;
+    invalidate() also drops everything at once when a new dataset is installed. While one
+    thread computes a missing key, other threads asking for the same key wait on its
+    Future instead of running the same computation again. Exceptions are passed to every
+    waiter and are not cached.
+    """
+    def __init__(self, max_entries=1024, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, endpoint, key, compute):
+        """Cached result for (endpoint, *key), computing it with compute() at most once at a time."""
+        if self.max_entries <= 0:
+            CACHE_LOOKUPS.inc(endpoint, "disabled")
+            return compute()
+        key = (endpoint,) + tuple(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                CACHE_LOOKUPS.inc(endpoint, "hit")
+                return entry[1]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                generation = self._generation
+        if not leader:
+            CACHE_LOOKUPS.inc(endpoint, "coalesced")
+            return future.result()
+
+        CACHE_LOOKUPS.inc(endpoint, "miss")
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._release(key, future)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._release(key, future)
+            # A result started before invalidate() belongs to the old dataset; hand it to the
+            # waiters that asked for it, but do not keep it
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        future.set_result(value)
+        return value
+
+    def _release(self, key, future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            # Late arrivals for the new dataset must not join a computation on the old one
+            self._inflight.clear()
+
+    def __len__(self):
+        return len(self._entries)
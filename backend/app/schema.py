@@ -0,0 +1,84 @@
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Text columns become categoricals when they have at most this many distinct values...
+CATEGORY_MAX_UNIQUE = 10_000
+# ...and repeat enough that codes plus one copy of each value beat one string per row
+CATEGORY_MAX_FRACTION = 0.5
+# Columns the recommenders tokenize or use as ids; they stay plain strings
+TEXT_COLUMNS = ['User', 'Friend', 'favorite_cuisines', 'movie_genres', 'series_genres', 'gaming_platforms',
+                'music_genres', 'reading_genres', 'shopping_preferences', 'travel_destinations',
+                'hobbies', 'clubs']
+
+def memory_bytes(df: pd.DataFrame):
+    """Resident size of df, counting the Python strings held by object columns."""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+def _compact_column(series: pd.Series):
+    if pd.api.types.is_bool_dtype(series) or isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast='integer')
+    if pd.api.types.is_float_dtype(series):
+        # Only narrows when every value survives the round trip through float32
+        return pd.to_numeric(series, downcast='float')
+    if pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+        n_unique = series.nunique()
+        if n_unique <= CATEGORY_MAX_UNIQUE and n_unique <= CATEGORY_MAX_FRACTION * len(series):
+            return series.astype('category')
+    return series
+
+def compact_dtypes(df: pd.DataFrame, keep=TEXT_COLUMNS):
+    """
+    Narrow df's columns to the smallest types that hold their values: integers to the
+    smallest signed width (Likert 1-5 scores become int8), floats to float32 when that is
+    lossless and repetitive strings to categoricals. Columns in keep are left alone.
+    Returns the compacted frame and a report of the memory before and after and the
+    columns that changed.
+    """
+    before = memory_bytes(df)
+    compacted = {}
+    changed = {}
+    for col in df.columns:
+        series = df[col]
+        if col not in keep:
+            series = _compact_column(series)
+            if series.dtype != df[col].dtype:
+                changed[col] = {"from": str(df[col].dtype), "to": str(series.dtype)}
+        compacted[col] = series
+    df = pd.DataFrame(compacted, index=df.index)
+    after = memory_bytes(df)
+    return df, {
+        "bytes_before": before,
+        "bytes_after": after,
+        "ratio": round(before / after, 2) if after else None,
+        "columns": changed,
+    }
+
+def widened_dtype(dtype):
+    """The type new rows are parsed into before appending them to a column of dtype."""
+    if isinstance(dtype, pd.CategoricalDtype):
+        return dtype.categories.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return dtype
+    if pd.api.types.is_integer_dtype(dtype):
+        return 'int64'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'float64'
+    return dtype
+
+def concat_compact(df: pd.DataFrame, new_rows: pd.DataFrame):
+    """
+    Append new_rows to a compacted df without losing values: categoricals take the union
+    of both sides' categories and numeric columns widen only as far as the new values need.
+    """
+    columns = {}
+    for col in df.columns:
+        old, new = df[col], new_rows[col]
+        if isinstance(old.dtype, pd.CategoricalDtype):
+            combined = union_categoricals([old, new.astype('category')], ignore_order=True)
+            columns[col] = pd.Series(combined, name=col)
+        else:
+            combined = pd.concat([old, new], ignore_index=True)
+            columns[col] = _compact_column(combined) if old.dtype != combined.dtype else combined
+    return pd.DataFrame(columns)
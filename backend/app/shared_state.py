@@ -0,0 +1,100 @@
+import json
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+import joblib
+
+try:
+    import fcntl
+except ImportError:  # Windows: publishes are not serialized across processes
+    fcntl = None
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive advisory lock on path, held across processes for the duration of the block."""
+    with open(path, "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+class SharedState:
+    """
+    Derived artefacts (models, feature matrices, stats) published once to disk so every
+    uvicorn worker can attach to them instead of rebuilding its own private copy.
+
+    Each publish writes a new generation directory of joblib files and then atomically
+    swaps the CURRENT pointer. Workers compare the generation in the pointer with the one
+    they hold and re-attach when it moves; numpy arrays are memory-mapped read-only, so all workers
+    share the same page-cache pages.
+    """
+    def __init__(self, root: str, keep_generations=2):
+        self.root = root
+        self.current_path = os.path.join(root, "CURRENT")
+        self.keep_generations = keep_generations
+        self.generation = None
+        os.makedirs(root, exist_ok=True)
+
+    def _read_current(self):
+        try:
+            with open(self.current_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def current(self):
+        """Metadata of the latest published generation, or None."""
+        return self._read_current()
+
+    def changed(self):
+        """
+        Whether a generation other than the one we hold is current. Reads the small pointer
+        file rather than trusting its mtime, which coarse-grained filesystems can leave
+        unchanged across two quick publishes.
+        """
+        pointer = self._read_current()
+        return pointer is not None and pointer.get("generation") != self.generation
+
+    def publish(self, artefacts: dict, **meta):
+        """Write artefacts as a new generation and make it current. Returns the generation number."""
+        os.makedirs(self.root, exist_ok=True)
+        with file_lock(os.path.join(self.root, "publish.lock")):
+            current = self._read_current() or {}
+            generation = current.get("generation", 0) + 1
+            dirname = f"gen-{generation:06d}-{uuid.uuid4().hex[:8]}"
+            path = os.path.join(self.root, dirname)
+            os.makedirs(path)
+            for key, obj in artefacts.items():
+                joblib.dump(obj, os.path.join(path, f"{key}.joblib"))
+
+            pointer = {"generation": generation, "dir": dirname, "keys": list(artefacts), **meta}
+            with open(self.current_path + ".tmp", "w") as f:
+                json.dump(pointer, f)
+            os.replace(self.current_path + ".tmp", self.current_path)
+            # Record what we published before releasing the lock, so a publish by another
+            # worker right after ours is still seen as a change
+            self.generation = generation
+            self._cleanup()
+        return generation
+
+    def attach(self):
+        """Memory-map the current generation. Returns (metadata, artefacts) or (None, None)."""
+        pointer = self._read_current()
+        if pointer is None:
+            return None, None
+        path = os.path.join(self.root, pointer["dir"])
+        artefacts = {key: joblib.load(os.path.join(path, f"{key}.joblib"), mmap_mode="r")
+                     for key in pointer["keys"]}
+        self.generation = pointer["generation"]
+        return pointer, artefacts
+
+    def _cleanup(self):
+        # Old generations may still be mapped by a slow worker; unlinking is safe on POSIX
+        # because mapped pages stay valid until the mapping is closed
+        generations = sorted(d for d in os.listdir(self.root) if d.startswith("gen-"))
+        for d in generations[:-self.keep_generations]:
+            shutil.rmtree(os.path.join(self.root, d), ignore_errors=True)
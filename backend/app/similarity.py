@@ -0,0 +1,77 @@
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+def l2_normalize(matrix):
+    """
+    Scale every row to unit length so a plain dot product gives cosine similarity.
+    Works for dense arrays and scipy sparse matrices; all-zero rows stay zero.
+    """
+    return normalize(matrix, norm='l2', axis=1, copy=True)
+
+def similarity_row(normalized, row: int):
+    """
+    Cosine similarity of a single row against every row of an L2-normalized matrix.
+    Costs O(N*d) time and O(N) memory instead of materialising the N x N matrix.
+    """
+    scores = normalized @ normalized[row].T
+    if sparse.issparse(scores):
+        scores = scores.toarray()
+    return np.asarray(scores).ravel()
+
+def top_k_indices(scores, k: int, exclude=None):
+    """
+    Positions of the k highest scores, best first, using a partial sort.
+    Ties are broken by position so results are deterministic.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if exclude is not None:
+        scores = scores.copy()
+        scores[exclude] = -np.inf
+    n_valid = int(np.count_nonzero(scores != -np.inf))
+    k = min(k, n_valid)
+    if k <= 0:
+        return np.array([], dtype=np.intp)
+    if k < len(scores):
+        part = np.argpartition(-scores, k - 1)[:k]
+        # Keep every row tied with the k-th score, then order by (score desc, position asc)
+        candidates = np.flatnonzero(scores >= scores[part].min())
+    else:
+        candidates = np.flatnonzero(scores != -np.inf)
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order[:k]]
+
+# Upper bound on the memory top_k_blocked holds at once: scores of a block plus any dense copy
+BLOCK_MEMORY_BYTES = 256 * 1024 * 1024
+
+def top_k_blocked(normalized, rows, k: int, block_rows=None):
+    """
+    Top-k neighbours for many rows, excluding each row itself.
+    Rows are scored in blocks with one matrix-matrix product per block, sized so the
+    block of scores stays within BLOCK_MEMORY_BYTES. Yields (row, positions) in input order.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    n_rows, n_cols = normalized.shape
+    budget = BLOCK_MEMORY_BYTES
+    if sparse.issparse(normalized) and 4 * n_rows * n_cols <= budget // 4:
+        # Narrow feature matrices (e.g. ~80 lifestyle columns at ~30% fill) are far faster as
+        # dense float32 BLAS products than as sparse @ sparse ones
+        normalized = normalized.astype(np.float32).toarray()
+        budget -= normalized.nbytes
+    if sparse.issparse(normalized):
+        # The sparse product's data and indices, then its dense copy
+        cell_bytes = 2 * normalized.dtype.itemsize + 4
+    else:
+        cell_bytes = normalized.dtype.itemsize
+    if block_rows is None:
+        block_rows = max(1, budget // (cell_bytes * max(n_rows, 1)))
+    for start in range(0, len(rows), block_rows):
+        block = rows[start:start + block_rows]
+        scores = normalized[block] @ normalized.T
+        if sparse.issparse(scores):
+            scores = scores.toarray()
+        scores = np.asarray(scores)
+        for i, row in enumerate(block):
+            yield int(row), top_k_indices(scores[i], k, exclude=row)
+        # Free this block before the next product, or two blocks are alive at once
+        del scores
@@ -0,0 +1,156 @@
+"""
+Lazy loading of the heavy modules (scikit-learn, scipy, matplotlib, seaborn, fpdf) and a
+report of what importing them costs.
+
+    python startup.py            # per-package import cost of `import main`, slowest first
+    python startup.py --top 10
+
+The CLI runs `python -X importtime -c "import main"` in a fresh interpreter, so it measures a
+true cold start. At runtime GET /api/startup shows when each lazy module was loaded, by whom
+and how long it took, plus recorded startup steps such as attaching to published models.
+"""
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# When this module was first imported; main imports it before anything else
+STARTED = time.perf_counter()
+_loads = {}
+_steps = {}
+_lazy_names = set()
+_lock = threading.Lock()
+_warmup_thread = None
+
+def _top_level_modules():
+    return {name.partition('.')[0] for name in list(sys.modules)}
+
+def load(name, trigger="request"):
+    """Import module name (once) and record how long it took and which packages it pulled in."""
+    module = sys.modules.get(name)
+    if module is not None and name in _loads:
+        return module
+    with _lock:
+        if name in _loads:
+            return sys.modules[name]
+        before = _top_level_modules()
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        elapsed = time.perf_counter() - start
+        _loads[name] = {
+            "seconds": round(elapsed, 4),
+            "trigger": trigger,
+            "loaded_at": round(time.perf_counter() - STARTED, 3),
+            "pulled_in": sorted(_top_level_modules() - before - {name}),
+        }
+        return module
+
+class LazyModule:
+    """Stands in for a module and imports it the first time one of its attributes is used."""
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(load(self._name), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._name in _loads else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+def lazy_module(name):
+    _lazy_names.add(name)
+    return LazyModule(name)
+
+@contextmanager
+def step(label):
+    """
+    Time a startup step and record the packages it imported. Unpickling models imports
+    their modules without going through LazyModule, so lazy modules that show up during the
+    step are marked loaded with the step as their trigger; their cost is the step's.
+    Only the first run of a label is kept.
+    """
+    before = _top_level_modules()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        pulled_in = sorted(_top_level_modules() - before)
+        loaded_at = round(time.perf_counter() - STARTED, 3)
+        with _lock:
+            if label not in _steps:
+                _steps[label] = {"seconds": round(elapsed, 4), "finished_at": loaded_at, "pulled_in": pulled_in}
+            for name in _lazy_names.intersection(pulled_in).difference(_loads):
+                _loads[name] = {"seconds": None, "trigger": label, "loaded_at": loaded_at, "pulled_in": []}
+
+def warm_up(names):
+    """Import names on a background thread so the first request that needs them does not pay for it."""
+    global _warmup_thread
+    def run():
+        for name in names:
+            try:
+                load(name, trigger="warmup")
+            except Exception:
+                # A broken optional stack should surface on the request that needs it, not here
+                pass
+    _warmup_thread = threading.Thread(target=run, name="friendlens-warmup", daemon=True)
+    _warmup_thread.start()
+    return _warmup_thread
+
+def report(ready_seconds=None):
+    """What startup and the lazy modules have cost so far."""
+    with _lock:
+        loads = dict(_loads)
+        steps = dict(_steps)
+    return {
+        "ready_seconds": ready_seconds,
+        "uptime_seconds": round(time.perf_counter() - STARTED, 3),
+        "warming_up": _warmup_thread is not None and _warmup_thread.is_alive(),
+        "lazy_modules": loads,
+        "steps": steps,
+    }
+
+def import_times(module="main", python=sys.executable):
+    """Cumulative cold import time in seconds per top-level package imported by module."""
+    result = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True)
+    # Lines are post-order (children before their parent) and indented two spaces per level;
+    # collect the direct children of `import module` and keep them once module itself shows up
+    totals = {}
+    children = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        if level == 1:
+            children.append((name.strip(), int(cumulative)))
+        elif level == 0:
+            if name.strip() == module:
+                for child, micros in children:
+                    package = child.partition('.')[0]
+                    totals[package] = totals.get(package, 0) + micros / 1e6
+            children = []
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+    return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold-start import cost per package")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args(argv)
+    totals = import_times(args.module)
+    for package, seconds in list(totals.items())[:args.top]:
+        print(f"{package:<30} {seconds * 1000:>9.1f} ms")
+    print(f"{'total':<30} {sum(totals.values()) * 1000:>9.1f} ms")
+
+if __name__ == "__main__":
+    main()
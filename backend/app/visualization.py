@@ -1,35 +1,106 @@
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
+import pandas as pd
+import hashlib
+import json
 import os
+import threading
+from metrics import span
 
+# Created on the first render rather than at import
 CHART_DIR = os.path.join(os.path.dirname(__file__), "charts")
-os.makedirs(CHART_DIR, exist_ok=True)
 
-def create_visualizations(df):
+# Rendered charts kept on disk; the least recently used ones beyond this are deleted
+MAX_CHARTS = 200
+_evict_lock = threading.Lock()
+
+def dataset_fingerprint(df: pd.DataFrame):
+    """Content hash of a DataFrame, for callers that have no dataset version to key on."""
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return hashlib.sha256(row_hashes.tobytes() + repr(list(df.columns)).encode()).hexdigest()[:16]
+
+def chart_spec(df: pd.DataFrame):
+    """Describe the chart create_visualizations draws for df, or None if there is nothing to plot."""
     # Simple visualization: top users count or numeric histogram fallback
     if 'User' in df.columns:
-        plt.figure(figsize=(10,6))
-        sns.countplot(data=df, x='User', order=df['User'].value_counts().index)
-        plt.xticks(rotation=90)
-        path = os.path.join(CHART_DIR, "user_count.png")
-        plt.tight_layout()
-        plt.savefig(path)
-        plt.close()
-        return path
+        return {"kind": "user_count", "column": "User"}
+    num_cols = df.select_dtypes(include=['number']).columns.tolist()
+    if not num_cols:
+        return None
+    return {"kind": "hist", "column": num_cols[0], "bins": 30}
+
+def chart_key(version, spec: dict):
+    """Content address of a chart: the dataset version plus everything that shapes the drawing."""
+    payload = json.dumps({"version": str(version), "spec": spec}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+def _safe_name(col):
+    # Sanitize column name for filename
+    safe_col_name = "".join(c for c in col if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    return safe_col_name.replace(' ', '_').replace('-', '_')
+
+def chart_filename(spec: dict, key: str):
+    slug = "user_count" if spec["kind"] == "user_count" else f"{_safe_name(spec['column'])[:60]}_hist"
+    return f"{slug}.{key}.png"
+
+def _plotting():
+    """matplotlib's Figure (on the Agg backend) and seaborn, imported on the first render."""
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+    import seaborn as sns
+    return Figure, sns
+
+def _render(df: pd.DataFrame, spec: dict):
+    Figure, sns = _plotting()
+    # A Figure of our own rather than pyplot's global state, so concurrent renders don't collide
+    if spec["kind"] == "user_count":
+        fig = Figure(figsize=(10, 6))
+        ax = fig.subplots()
+        col = spec["column"]
+        sns.countplot(data=df, x=col, order=df[col].value_counts().index, ax=ax)
+        ax.tick_params(axis='x', labelrotation=90)
     else:
-        num_cols = df.select_dtypes(include=['number']).columns.tolist()
-        if not num_cols:
-            return None
-        col = num_cols[0]
-        # Sanitize column name for filename
-        safe_col_name = "".join(c for c in col if c.isalnum() or c in (' ', '-', '_')).rstrip()
-        safe_col_name = safe_col_name.replace(' ', '_').replace('-', '_')
-        path = os.path.join(CHART_DIR, f"{safe_col_name}_hist.png")
-        plt.figure(figsize=(8,5))
-        sns.histplot(df[col].dropna(), bins=30)
-        plt.tight_layout()
-        plt.savefig(path)
-        plt.close()
+        fig = Figure(figsize=(8, 5))
+        ax = fig.subplots()
+        sns.histplot(df[spec["column"]].dropna(), bins=spec["bins"], ax=ax)
+    fig.tight_layout()
+    return fig
+
+def _evict():
+    with _evict_lock:
+        charts = [os.path.join(CHART_DIR, f) for f in os.listdir(CHART_DIR) if f.count('.') == 2 and f.endswith('.png')]
+        if len(charts) <= MAX_CHARTS:
+            return
+        charts.sort(key=os.path.getmtime)
+        for path in charts[:len(charts) - MAX_CHARTS]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+def create_visualizations(df, version=None):
+    """
+    Render the default chart for df and return its path. Charts are cached on disk under
+    a hash of the dataset version and chart spec, so repeat calls only touch the file.
+    """
+    spec = chart_spec(df)
+    if spec is None:
+        return None
+    if version is None:
+        with span("chart_fingerprint"):
+            version = dataset_fingerprint(df)
+    path = os.path.join(CHART_DIR, chart_filename(spec, chart_key(version, spec)))
+
+    if os.path.exists(path):
+        # Cache hit: bump the mtime so LRU eviction keeps it
+        os.utime(path)
         return path
+
+    with span("chart_render"):
+        fig = _render(df, spec)
+    os.makedirs(CHART_DIR, exist_ok=True)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with span("png_encode"):
+        fig.savefig(tmp, format="png")
+    os.replace(tmp, path)
+    _evict()
+    return path
@@ -0,0 +1,87 @@
+"""
+Seeded synthetic datasets in the three schemas FriendLens understands. The same
+(n, seed) always produces the same frame, so timings are comparable across commits.
+"""
+import numpy as np
+import pandas as pd
+
+TRAIT_COLS = ['Spice_Tolerance', 'Sweet_Tooth_Level', 'Ethical_Shopping', 'Travel_Planning_Pref',
+              'Introversion_Extraversion', 'Risk_Taking', 'Conscientiousness', 'Open_to_New_Exp',
+              'Teamwork_Preference']
+DIETS = ['Veg', 'Non-Veg']
+DRINKS = ['Tea', 'Coffee', 'Both']
+HOBBY_CLUBS = [('Reading', 'BookClub'), ('Sports', 'SportsClub'), ('Gaming', 'GamingClub'),
+               ('Traveling', 'TravelClub'), ('Cooking', 'CookingClub'), ('Coding', 'CodingClub')]
+
+LIFESTYLE_VOCAB = {
+    'favorite_cuisines': ['Italian', 'Chinese', 'Mexican', 'Indian', 'Japanese', 'Thai', 'French', 'Korean'],
+    'movie_genres': ['Action', 'Comedy', 'Horror', 'Romance', 'Drama', 'SciFi', 'Thriller', 'Animation'],
+    'series_genres': ['Drama', 'Thriller', 'Comedy', 'SciFi', 'Crime', 'Fantasy', 'Documentary'],
+    'gaming_platforms': ['PC', 'PlayStation', 'Xbox', 'Mobile', 'Switch'],
+    'music_genres': ['Pop', 'Rock', 'HipHop', 'Jazz', 'Classical', 'EDM', 'Indie', 'Metal'],
+    'reading_genres': ['Fiction', 'Mystery', 'NonFiction', 'Biography', 'Fantasy', 'SelfHelp'],
+    'shopping_preferences': ['Online', 'Clothing', 'Books', 'Electronics', 'Local', 'Thrift'],
+    'travel_destinations': ['Europe', 'Asia', 'America', 'Africa', 'Oceania'],
+    'hobbies': ['Reading', 'Gaming', 'Traveling', 'Cooking', 'Sports', 'Coding', 'Music', 'Art',
+                'Photography', 'Dancing', 'Hiking', 'Writing'],
+    'clubs': ['BookClub', 'GamingClub', 'TravelClub', 'CookingClub', 'SportsClub', 'CodingClub',
+              'MusicClub', 'ArtClub', 'PhotographyClub', 'DanceClub'],
+}
+# Distinct comma-joined lists drawn per column; rows pick from this pool
+LIST_POOL_SIZE = 4096
+
+def trait_data(n: int, seed: int = 0):
+    """friendlens_data.csv schema: nine 1-5 Likert traits plus four preference columns."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.integers(1, 6, size=(n, len(TRAIT_COLS))), columns=TRAIT_COLS)
+    df['Diet'] = rng.choice(DIETS, n)
+    df['Tea_vs_Coffee'] = rng.choice(DRINKS, n)
+    hobby = rng.integers(0, len(HOBBY_CLUBS), n)
+    df['Hobby_Top1'] = np.array([h for h, _ in HOBBY_CLUBS])[hobby]
+    df['Club_Top1'] = np.array([c for _, c in HOBBY_CLUBS])[hobby]
+    return df
+
+def _list_pool(rng, vocab):
+    pool = []
+    for _ in range(LIST_POOL_SIZE):
+        size = rng.integers(1, 4)
+        pool.append(",".join(rng.choice(vocab, size=size, replace=False)))
+    return np.array(pool, dtype=object)
+
+def lifestyle_data(n: int, seed: int = 0):
+    """Lifestyle schema read by the hobby recommender: user_id, numeric columns and list columns."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'user_id': np.arange(1, n + 1),
+        'age': rng.integers(18, 30, n),
+        'height': rng.integers(150, 195, n),
+        'weight': rng.integers(45, 100, n),
+        'spice_tolerance': rng.integers(1, 6, n),
+    })
+    for col in ['favorite_cuisines', 'movie_genres', 'series_genres', 'gaming_platforms']:
+        df[col] = _list_pool(rng, LIFESTYLE_VOCAB[col])[rng.integers(0, LIST_POOL_SIZE, n)]
+    df['social_media_hours'] = rng.integers(0, 10, n)
+    for col in ['music_genres', 'reading_genres', 'shopping_preferences', 'travel_destinations', 'hobbies', 'clubs']:
+        df[col] = _list_pool(rng, LIFESTYLE_VOCAB[col])[rng.integers(0, LIST_POOL_SIZE, n)]
+    return df
+
+def edge_data(n: int, seed: int = 0, n_users: int = None):
+    """
+    User/Friend edge list with n edges between n_users people (n / 10 by default).
+    Friends are drawn from a Zipf-like popularity so a few people have many followers.
+    """
+    rng = np.random.default_rng(seed)
+    n_users = n_users or max(10, n // 10)
+    names = np.array([f"user{i}" for i in range(n_users)], dtype=object)
+    users = rng.integers(0, n_users, n)
+    popularity = 1.0 / np.arange(1, n_users + 1)
+    friends = rng.choice(n_users, size=n, p=popularity / popularity.sum())
+    # Shift self-loops to the next person
+    friends = np.where(friends == users, (friends + 1) % n_users, friends)
+    return pd.DataFrame({'User': names[users], 'Friend': names[friends]})
+
+GENERATORS = {
+    'traits': trait_data,
+    'lifestyle': lifestyle_data,
+    'edges': edge_data,
+}
@@ -0,0 +1,310 @@
+"""
+Benchmarks for the FriendLens hot paths on seeded synthetic data.
+
+    python benchmarks/run.py --sizes 1000,10000 --output bench.json
+    python benchmarks/run.py --sizes 1000,10000 --compare bench.json
+
+Times CSV ingest, model building, all-pairs kNN tables, get_recommendations, recommend_hobbies,
+create_visualizations and the FastAPI endpoints (through an in-process test client)
+for each schema and size, and writes the results as JSON together with the commit
+they were measured on. --compare prints the ratio against an earlier results file
+and exits non-zero when anything got slower than --threshold. Wherever a model builds
+an approximate index, its recall@10 against brute force is checked too, and the run
+fails if it is below --min-recall.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend", "app"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from generators import GENERATORS
+
+GROUPS = ['ingest', 'friends', 'hobbies', 'visualize', 'api']
+# Schemas each group applies to
+GROUP_SCHEMAS = {
+    'ingest': ['traits', 'lifestyle', 'edges'],
+    'friends': ['traits', 'edges'],
+    'hobbies': ['lifestyle'],
+    'visualize': ['traits', 'lifestyle', 'edges'],
+    'api': ['traits', 'lifestyle', 'edges'],
+}
+AUTH = ('FriendLens1', '12345678')
+
+def measure(fn, repeat=5, calls=1, warmup=1):
+    """Run fn warmup + repeat times; timings are per call when fn makes `calls` calls."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000 / calls)
+    return {
+        "repeat": repeat,
+        "calls": calls,
+        "min_ms": round(min(times), 4),
+        "median_ms": round(statistics.median(times), 4),
+        "mean_ms": round(statistics.fmean(times), 4),
+    }
+
+class Suite:
+    def __init__(self, repeat, queries, seed, workdir):
+        self.repeat = repeat
+        self.queries = queries
+        self.seed = seed
+        self.workdir = workdir
+        self.results = []
+        self.recall = []
+
+    def record(self, name, schema, rows, stats):
+        entry = {"name": name, "schema": schema, "rows": rows, **stats}
+        self.results.append(entry)
+        print(f"  {name:<34} {schema:<10} {rows:>9} rows  median {entry['median_ms']:>11.3f} ms", flush=True)
+
+    def record_recall(self, name, schema, rows, index):
+        import ann
+        if index is None:
+            return
+        entry = {"name": name, "schema": schema, "rows": rows,
+                 **ann.recall_at_k(index, k=10, n_queries=self.queries, random_state=self.seed + 1)}
+        self.recall.append(entry)
+        print(f"  {name:<34} {schema:<10} {rows:>9} rows  recall@10 {entry['recall']:.3f} "
+              f"(n_probe {entry['n_probe']}/{entry['n_lists']})", flush=True)
+
+    def repeat_for(self, rows, heavy=False):
+        # Keep model fits and cold renders affordable on the large sizes
+        if heavy and rows >= 100_000:
+            return 1
+        return self.repeat
+
+    def warmup_for(self, rows):
+        return int(rows < 100_000)
+
+    def sample_ids(self, ids):
+        rng = np.random.default_rng(self.seed)
+        ids = np.asarray(ids)
+        return ids[rng.choice(len(ids), size=min(self.queries, len(ids)), replace=False)].tolist()
+
+def bench_ingest(suite, schema, df):
+    from ingest import read_csv_fast
+    rows = len(df)
+    path = os.path.join(suite.workdir, f"{schema}-{rows}.csv")
+    df.to_csv(path, index=False)
+    suite.record("ingest.read_csv_fast", schema, rows, measure(lambda: read_csv_fast(path), suite.repeat_for(rows)))
+    suite.record("ingest.pandas_read_csv", schema, rows, measure(lambda: pd.read_csv(path), suite.repeat_for(rows)))
+    from schema import compact_dtypes
+    parsed = read_csv_fast(path)
+    suite.record("ingest.compact_dtypes", schema, rows, measure(lambda: compact_dtypes(parsed), suite.repeat_for(rows)))
+
+def bench_friends(suite, schema, df):
+    from recommender import build_recommender_model, get_recommendations, batch_recommendations
+    rows = len(df)
+    suite.record("friends.build_model", schema, rows,
+                 measure(lambda: build_recommender_model(df), suite.repeat_for(rows, heavy=True), warmup=suite.warmup_for(rows)))
+    model = build_recommender_model(df)
+    ids = suite.sample_ids(model.labels)
+
+    def query():
+        for uid in ids:
+            get_recommendations(df, uid, model=model)
+    suite.record("friends.get_recommendations", schema, rows, measure(query, suite.repeat, calls=len(ids)))
+    suite.record("friends.batch_recommendations", schema, rows,
+                 measure(lambda: list(batch_recommendations(model, ids)), suite.repeat, calls=len(ids)))
+    suite.record_recall("friends.ann_recall", schema, rows, model.index)
+
+    from knn_table import build_knn_table
+    suite.record("friends.build_knn_table", schema, rows,
+                 measure(lambda: build_knn_table(model.features, 10), suite.repeat_for(rows, heavy=True),
+                         warmup=suite.warmup_for(rows)))
+
+def bench_hobbies(suite, schema, df):
+    from hobby_recommender import build_feature_model, recommend_hobbies, recommend_hobbies_batch
+    rows = len(df)
+    suite.record("hobbies.build_model", schema, rows,
+                 measure(lambda: build_feature_model(df), suite.repeat_for(rows, heavy=True), warmup=suite.warmup_for(rows)))
+    model = build_feature_model(df)
+    ids = suite.sample_ids(df['user_id'])
+
+    def query():
+        for uid in ids:
+            recommend_hobbies(df, uid, model=model)
+    suite.record("hobbies.recommend_hobbies", schema, rows, measure(query, suite.repeat, calls=len(ids)))
+    suite.record("hobbies.recommend_hobbies_batch", schema, rows,
+                 measure(lambda: list(recommend_hobbies_batch(model, ids)), suite.repeat, calls=len(ids)))
+    suite.record_recall("hobbies.ann_recall", schema, rows, model.index)
+
+def bench_visualize(suite, schema, df):
+    import visualization
+    visualization.CHART_DIR = os.path.join(suite.workdir, "charts")
+    os.makedirs(visualization.CHART_DIR, exist_ok=True)
+    rows = len(df)
+    runs = iter(range(10 ** 9))
+    # A fresh version each call forces a render; a fixed one measures the cache hit
+    suite.record("visualize.render", schema, rows,
+                 measure(lambda: visualization.create_visualizations(df, version=f"bench-{schema}-{rows}-{next(runs)}"),
+                         suite.repeat_for(rows, heavy=True), warmup=suite.warmup_for(rows)))
+    suite.record("visualize.cached", schema, rows,
+                 measure(lambda: visualization.create_visualizations(df, version=f"bench-{schema}-{rows}-cached"), suite.repeat))
+
+def _api_client(workdir):
+    """TestClient for the app with its uploads, store and charts pointed at workdir."""
+    from fastapi.testclient import TestClient
+    import main
+    import visualization
+    from dataset_store import DatasetStore
+    from shared_state import SharedState
+    from response_cache import ResponseCache
+    # Timed calls must do the work, not hit the cache the warmup call filled; see bench_api
+    main.RESPONSES = ResponseCache(max_entries=0)
+    main.UPLOAD_DIR = os.path.join(workdir, "uploads")
+    os.makedirs(main.UPLOAD_DIR, exist_ok=True)
+    main.STORE = DatasetStore(os.path.join(main.UPLOAD_DIR, "datasets"))
+    main.SHARED = SharedState(os.path.join(main.UPLOAD_DIR, "shared"))
+    visualization.CHART_DIR = main.CHART_DIR = os.path.join(workdir, "charts")
+    os.makedirs(main.CHART_DIR, exist_ok=True)
+    return TestClient(main.app)
+
+def bench_api(suite, schema, df, client):
+    rows = len(df)
+    path = os.path.join(suite.workdir, f"api-{schema}-{rows}.csv")
+    df.to_csv(path, index=False)
+
+    def upload():
+        with open(path, "rb") as f:
+            response = client.post("/api/upload", files={"file": (f"{schema}.csv", f)}, auth=AUTH)
+        response.raise_for_status()
+    suite.record("api.upload", schema, rows, measure(upload, suite.repeat_for(rows, heavy=True), warmup=suite.warmup_for(rows)))
+
+    def get_all(urls):
+        def run():
+            for url in urls:
+                client.get(url, auth=AUTH).raise_for_status()
+        return run
+
+    def record_with_cache(name, urls):
+        # Uncached with the disabled cache _api_client installs, then again through a real one
+        import main
+        from response_cache import ResponseCache
+        suite.record(name, schema, rows, measure(get_all(urls), suite.repeat, calls=len(urls)))
+        uncached, main.RESPONSES = main.RESPONSES, ResponseCache()
+        try:
+            suite.record(f"{name}.cached", schema, rows, measure(get_all(urls), suite.repeat, calls=len(urls)))
+        finally:
+            main.RESPONSES = uncached
+
+    if schema == 'edges':
+        ids = suite.sample_ids(df['User'].unique())
+        record_with_cache("api.recommend", [f"/api/recommend/{uid}" for uid in ids])
+    if schema == 'lifestyle':
+        ids = suite.sample_ids(df['user_id'])
+        record_with_cache("api.recommend_hobbies", [f"/api/recommend_hobbies/{uid}" for uid in ids])
+    suite.record("api.preview", schema, rows, measure(get_all(["/api/preview?n=100"]), suite.repeat))
+    suite.record("api.summary", schema, rows, measure(get_all(["/api/summary"]), suite.repeat))
+    suite.record("api.visualize", schema, rows, measure(get_all(["/api/visualize"]), suite.repeat))
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _metadata(args):
+    import sklearn
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "queries": args.queries,
+    }
+
+def compare(results, baseline_path, threshold, min_ms=1.0):
+    """
+    Print current/baseline median ratios; return the entries slower than threshold.
+    Timings under min_ms are too noisy to call regressions and are only printed.
+    """
+    with open(baseline_path) as f:
+        baseline = {(r["name"], r["schema"], r["rows"]): r for r in json.load(f)["results"]}
+    regressions = []
+    print(f"\nCompared with {baseline_path}:")
+    for r in results:
+        old = baseline.get((r["name"], r["schema"], r["rows"]))
+        if old is None or not old["median_ms"]:
+            continue
+        ratio = r["median_ms"] / old["median_ms"]
+        flag = "  SLOWER" if ratio > threshold and r["median_ms"] >= min_ms else ""
+        print(f"  {r['name']:<34} {r['schema']:<10} {r['rows']:>9}  {old['median_ms']:>11.3f} -> "
+              f"{r['median_ms']:>11.3f} ms  x{ratio:.2f}{flag}")
+        if flag:
+            regressions.append(r)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the FriendLens hot paths on synthetic data.")
+    parser.add_argument("--sizes", default="1000,10000", help="comma-separated row counts (1k-1M)")
+    parser.add_argument("--schemas", default="traits,lifestyle,edges")
+    parser.add_argument("--groups", default=",".join(GROUPS), help=f"subset of {','.join(GROUPS)}")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=50, help="users sampled for per-query timings")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="ratio counted as a regression")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="ignore regressions in timings below this")
+    parser.add_argument("--min-recall", type=float, default=0.9, help="lowest acceptable ANN recall@10")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    schemas = args.schemas.split(",")
+    groups = args.groups.split(",")
+    benches = {'ingest': bench_ingest, 'friends': bench_friends, 'hobbies': bench_hobbies,
+               'visualize': bench_visualize, 'api': bench_api}
+
+    with tempfile.TemporaryDirectory(prefix="friendlens-bench-") as workdir:
+        suite = Suite(args.repeat, args.queries, args.seed, workdir)
+        client = _api_client(workdir) if 'api' in groups else None
+        for rows in sizes:
+            for schema in schemas:
+                df = GENERATORS[schema](rows, seed=args.seed)
+                print(f"{schema} x {rows}", flush=True)
+                for group in groups:
+                    if schema not in GROUP_SCHEMAS[group]:
+                        continue
+                    if group == 'api':
+                        bench_api(suite, schema, df, client)
+                    else:
+                        benches[group](suite, schema, df)
+
+    report = {"meta": _metadata(args), "results": suite.results, "recall": suite.recall}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {len(suite.results)} results to {args.output}")
+    low_recall = [r for r in suite.recall if r["recall"] < args.min_recall]
+    for r in low_recall:
+        print(f"  {r['name']:<34} {r['schema']:<10} {r['rows']:>9}  recall@10 {r['recall']:.3f} "
+              f"below {args.min_recall}")
+    regressions = args.compare and compare(suite.results, args.compare, args.threshold, args.min_ms)
+    if low_recall or regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -144,12 +144,12 @@ export default function App(){
   };
 
   const analyzeTask = async ()=>{
-    const task = prompt('Describe what you want to analyze (e.g., "give me a summary", "recommend friends for Alice", "create a visualization"):');
+    const task = prompt('Describe what you want to analyze (e.g., "give me a summary", "recommend friends for Alice", "create a visualization"). Separate several tasks with ";":');
     if(!task) return;
     setLoading(true);
     try{
       const fd = new FormData();
-      fd.append('task', task);
+      task.split(';').map(t=>t.trim()).filter(Boolean).forEach(t=>fd.append('task', t));
       const res = await axios.post(`${API}/analyze`, fd, getAuthConfig());
       alert('Analysis Result: ' + JSON.stringify(res.data, null, 2));
     }catch(e){ console.error(e); alert('Analysis failed'); }
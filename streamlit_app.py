@@ -1,11 +1,20 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import plotly.express as px
-from sklearn.metrics.pairwise import cosine_similarity
-from fpdf import FPDF
+import hashlib
 import os
+import sys
+import threading
+
+# Reuse the backend's similarity helpers and approximate-neighbour index
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend", "app"))
+from similarity import l2_normalize, top_k_indices
+from ann import build_ann_index
+from reports import render_report
+from schema import compact_dtypes
+from plot_data import scatter_data
 
 # Set page config
 st.set_page_config(
@@ -105,13 +114,30 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Load preloaded dataset
+DATA_PATH = "friendlens_data.csv"
+
 @st.cache_data
-def load_data():
+def data_file_hash(path, size, mtime_ns):
+    """Content hash of the data file; only re-read when its size or mtime changes."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def current_data_hash():
+    if not os.path.exists(DATA_PATH):
+        return "sample"
+    stat = os.stat(DATA_PATH)
+    return data_file_hash(DATA_PATH, stat.st_size, stat.st_mtime_ns)
+
+# Load preloaded dataset. cache_resource hands every rerun the same DataFrame instead of
+# a fresh copy; the app never modifies it.
+@st.cache_resource
+def load_data(data_hash):
     # Use the friendlens data as preloaded dataset
-    data_path = "friendlens_data.csv"
-    if os.path.exists(data_path):
-        df = pd.read_csv(data_path)
+    if os.path.exists(DATA_PATH):
+        df = pd.read_csv(DATA_PATH)
     else:
         # Fallback to a sample dataset if file not found
         data = {
@@ -130,9 +156,87 @@ def load_data():
             'Club_Top1': np.random.choice(['BookClub', 'SportsClub', 'GamingClub', 'CodingClub', 'TravelClub', 'CookingClub'], 100)
         }
         df = pd.DataFrame(data)
+    # Likert scores as int8 and the label columns as categoricals
+    df, _ = compact_dtypes(df)
     return df
 
-df = load_data()
+data_hash = current_data_hash()
+df = load_data(data_hash)
+
+numeric_cols = ['Spice_Tolerance', 'Sweet_Tooth_Level', 'Ethical_Shopping', 'Travel_Planning_Pref', 'Introversion_Extraversion', 'Risk_Taking', 'Conscientiousness', 'Open_to_New_Exp', 'Teamwork_Preference']
+
+@st.cache_resource
+def build_similarity_engine(data_hash):
+    """
+    Everything profile matching needs from the dataset, computed once per data file version:
+    the L2-normalized trait matrix, column means and (for large files) an approximate index.
+    """
+    data = load_data(data_hash)
+    normalized = l2_normalize(data[numeric_cols].to_numpy(dtype=np.float32))
+    return {
+        "normalized": normalized,
+        "means": data[numeric_cols].mean().to_numpy(),
+        "index": build_ann_index(normalized),
+    }
+
+# The charts below are drawn once per data file version; each run only moves the user's
+# values. The lock keeps concurrent sessions from redrawing the shared figure at once.
+@st.cache_resource
+def comparison_chart(data_hash):
+    means = build_similarity_engine(data_hash)["means"]
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    x = np.arange(len(numeric_cols))
+    width = 0.35
+
+    user_bars = ax.bar(x - width/2, np.zeros(len(numeric_cols)), width, label='Your Profile', color='#4f46e5')
+    ax.bar(x + width/2, means, width, label='Dataset Average', color='#7c3aed')
+
+    ax.set_xlabel('Attributes')
+    ax.set_ylabel('Scores')
+    ax.set_title('Profile Comparison')
+    ax.set_xticks(x)
+    ax.set_xticklabels([col.replace('_', ' ') for col in numeric_cols])
+    ax.set_ylim(0, max(5, float(np.nanmax(means))) * 1.05)
+    ax.legend()
+    return fig, user_bars, threading.Lock()
+
+@st.cache_resource
+def radar_chart(data_hash):
+    categories = numeric_cols
+    fig = Figure(figsize=(6, 6))
+    ax = fig.subplots(subplot_kw=dict(projection='polar'))
+
+    angles = np.linspace(0, 2 * np.pi, len(categories), endpoint=False).tolist()
+    angles += angles[:1]
+
+    polygon, = ax.fill(angles, np.zeros(len(angles)), 'o-', linewidth=2, label='Your Profile', color='#4f46e5')
+    ax.set_xticks(angles[:-1])
+    ax.set_xticklabels([col.replace('_', ' ') for col in categories])
+    ax.set_ylim(0, 5)
+    ax.set_title('Your Profile Attributes')
+    ax.grid(True)
+    return fig, polygon, angles, threading.Lock()
+
+# Binned once per data file version, so the chart payload depends on the number of
+# occupied cells rather than the number of rows
+@st.cache_resource
+def trend_scatter_data(data_hash):
+    return scatter_data(load_data(data_hash), 'Spice_Tolerance', 'Sweet_Tooth_Level', color='Diet')
+
+def trend_chart(data_hash, style):
+    points, mode = trend_scatter_data(data_hash)
+    title = 'Spice Tolerance vs Sweet Tooth Level by Diet'
+    if mode == "sampled":
+        return px.scatter(points, x='Spice_Tolerance', y='Sweet_Tooth_Level', color='Diet',
+                          title=f'{title} (sample of {len(points)} profiles)')
+    if style == "Heatmap":
+        # String axes give one cell per score instead of plotly's automatic numeric bins
+        points = points.astype({'Spice_Tolerance': str, 'Sweet_Tooth_Level': str})
+        return px.density_heatmap(points, x='Spice_Tolerance', y='Sweet_Tooth_Level', z='count',
+                                  facet_col='Diet', histfunc='sum', title=title)
+    return px.scatter(points, x='Spice_Tolerance', y='Sweet_Tooth_Level', color='Diet', size='count',
+                      hover_data=['count'], size_max=40, title=title)
 
 # Title and description
 st.title("🔍 FriendLens")
@@ -185,9 +289,13 @@ hobby_top1 = st.sidebar.selectbox("Top Hobby", ['Reading', 'Sports', 'Gaming', '
 club_top1 = st.sidebar.selectbox("Top Club", ['BookClub', 'SportsClub', 'GamingClub', 'CodingClub', 'TravelClub', 'CookingClub'])
 
 analyze_button = st.sidebar.button("✨ Analyze My Profile")
+# A button is only True for the run right after the click; remember it so the results
+# survive the reruns that widgets inside them trigger
+if analyze_button:
+    st.session_state.analyzed = True
 
 # Main content
-if analyze_button:
+if st.session_state.get("analyzed"):
     user_profile = {
         'Spice_Tolerance': spice_tolerance,
         'Sweet_Tooth_Level': sweet_tooth_level,
@@ -233,17 +341,22 @@ if analyze_button:
     st.header("🤝 Personalized Recommendations")
 
     # Prepare data for similarity calculation
-    numeric_cols = ['Spice_Tolerance', 'Sweet_Tooth_Level', 'Ethical_Shopping', 'Travel_Planning_Pref', 'Introversion_Extraversion', 'Risk_Taking', 'Conscientiousness', 'Open_to_New_Exp', 'Teamwork_Preference']
-    user_vector = np.array([user_profile[col] for col in numeric_cols]).reshape(1, -1)
-    dataset_vectors = df[numeric_cols].values
+    user_vector = np.array([user_profile[col] for col in numeric_cols], dtype=np.float32).reshape(1, -1)
+    user_unit = l2_normalize(user_vector)[0]
+    engine = build_similarity_engine(data_hash)
 
-    # Calculate cosine similarity
-    similarities = cosine_similarity(user_vector, dataset_vectors)[0]
+    if engine["index"] is not None:
+        # Large dataset: only score the rows in the closest index buckets
+        top_indices, top_scores = engine["index"].query(user_unit, 5)
+    else:
+        # Cosine similarity against the pre-normalized matrix is a single dot product
+        similarities = engine["normalized"] @ user_unit
 
-    # Get top 5 similar users
-    top_indices = similarities.argsort()[-5:][::-1]
+        # Get top 5 similar users
+        top_indices = top_k_indices(similarities, 5)
+        top_scores = similarities[top_indices]
     recommendations = df.iloc[top_indices].copy()
-    recommendations['similarity'] = similarities[top_indices]
+    recommendations['similarity'] = top_scores
 
     st.markdown("""
     <div class="card">
@@ -276,70 +389,34 @@ if analyze_button:
     # Comparison Chart
     st.subheader("Your Profile vs Dataset Average")
     user_values = [user_profile[col] for col in numeric_cols]
-    avg_values = df[numeric_cols].mean().values
-
-    fig, ax = plt.subplots(figsize=(10, 6))
-    x = np.arange(len(numeric_cols))
-    width = 0.35
-
-    ax.bar(x - width/2, user_values, width, label='Your Profile', color='#4f46e5')
-    ax.bar(x + width/2, avg_values, width, label='Dataset Average', color='#7c3aed')
 
-    ax.set_xlabel('Attributes')
-    ax.set_ylabel('Scores')
-    ax.set_title('Profile Comparison')
-    ax.set_xticks(x)
-    ax.set_xticklabels([col.replace('_', ' ') for col in numeric_cols])
-    ax.legend()
-
-    st.pyplot(fig)
+    fig, user_bars, lock = comparison_chart(data_hash)
+    with lock:
+        for bar, value in zip(user_bars, user_values):
+            bar.set_height(value)
+        st.pyplot(fig)
 
     # Radar Chart
     st.subheader("Your Profile Radar")
-    categories = numeric_cols
-    fig, ax = plt.subplots(figsize=(6, 6), subplot_kw=dict(projection='polar'))
-
-    angles = np.linspace(0, 2 * np.pi, len(categories), endpoint=False).tolist()
+    fig, polygon, angles, lock = radar_chart(data_hash)
     user_values_radar = user_values + user_values[:1]
-    angles += angles[:1]
-
-    ax.fill(angles, user_values_radar, 'o-', linewidth=2, label='Your Profile', color='#4f46e5')
-    ax.set_xticks(angles[:-1])
-    ax.set_xticklabels([col.replace('_', ' ') for col in categories])
-    ax.set_ylim(0, 5)
-    ax.set_title('Your Profile Attributes')
-    ax.grid(True)
-
-    st.pyplot(fig)
+    with lock:
+        polygon.set_xy(np.column_stack([angles, user_values_radar]))
+        st.pyplot(fig)
 
     # Create Visualization Button
     if st.button("🎨 Create Additional Visualization"):
+        st.session_state.show_trends = True
+    if st.session_state.get("show_trends"):
         st.subheader("Dataset Trends")
-        fig = px.scatter(df, x='Spice_Tolerance', y='Sweet_Tooth_Level', color='Diet',
-                        title='Spice Tolerance vs Sweet Tooth Level by Diet')
-        st.plotly_chart(fig)
+        trend_style = st.radio("Trend chart style", ["Bubbles", "Heatmap"], horizontal=True)
+        st.plotly_chart(trend_chart(data_hash, trend_style))
 
     # Download Report
     if st.button("📄 Download My Report"):
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-        pdf.cell(200, 10, txt="FriendLens Profile Report", ln=True, align='C')
-        pdf.cell(200, 10, txt=f"Spice Tolerance: {spice_tolerance}", ln=True)
-        pdf.cell(200, 10, txt=f"Sweet Tooth Level: {sweet_tooth_level}", ln=True)
-        pdf.cell(200, 10, txt=f"Ethical Shopping: {ethical_shopping}", ln=True)
-        pdf.cell(200, 10, txt=f"Travel Planning Pref: {travel_planning_pref}", ln=True)
-        pdf.cell(200, 10, txt=f"Introversion-Extraversion: {introversion_extraversion}", ln=True)
-        pdf.cell(200, 10, txt=f"Risk Taking: {risk_taking}", ln=True)
-        pdf.cell(200, 10, txt=f"Conscientiousness: {conscientiousness}", ln=True)
-        pdf.cell(200, 10, txt=f"Open to New Exp: {open_to_new_exp}", ln=True)
-        pdf.cell(200, 10, txt=f"Teamwork Preference: {teamwork_preference}", ln=True)
-        pdf.cell(200, 10, txt=f"Diet: {diet}", ln=True)
-        pdf.cell(200, 10, txt=f"Tea vs Coffee: {tea_vs_coffee}", ln=True)
-        pdf.cell(200, 10, txt=f"Top Hobby: {hobby_top1}", ln=True)
-        pdf.cell(200, 10, txt=f"Top Club: {club_top1}", ln=True)
-
-        pdf_output = pdf.output(dest='S').encode('latin-1')
+        matches = [(f"Profile {i+1} - {row['Diet']}, {row['Tea_vs_Coffee']}, {row['Hobby_Top1']}, {row['Club_Top1']}", row['similarity'])
+                   for i, (_, row) in enumerate(recommendations.iterrows())]
+        pdf_output = render_report(user_profile, matches)
         st.download_button(
             label="Download PDF",
             data=pdf_output,
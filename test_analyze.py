@@ -24,3 +24,14 @@ for task in tasks:
         print('Result:', result['result'])
     else:
         print('Error:', response.text)
+
+# Several tasks in one request, run against the same dataset snapshot
+url_analyze = 'http://127.0.0.1:8000/api/analyze'
+response = requests.post(url_analyze, data={'task': tasks}, auth=('FriendLens1', '12345678'))
+print('\nAll tasks at once')
+print('Status:', response.status_code)
+if response.status_code == 200:
+    for item in response.json()['results']:
+        print(f'Task: "{item["task"]}" ->', item['result'])
+else:
+    print('Error:', response.text)